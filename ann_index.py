@@ -0,0 +1,107 @@
+import numpy as np
+from quantization import max_scores
+from vector_ops import normalize_rows, select_top_k
+
+# Below this many stored vectors an exhaustive scan is fast enough and always exact
+ANN_THRESHOLD = 50_000
+# Lists probed per query; higher is slower but finds more of the true neighbours
+DEFAULT_N_PROBE = 16
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 30_000
+ASSIGN_BLOCK = 8192
+
+class ExactSearcher:
+    """Exhaustive inner-product search over a unit-normalized matrix."""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def search(self, query, k):
+        """
+        Returns:
+            (row indices, scores) of the k rows closest to query, best first.
+        """
+        return select_top_k(self.matrix @ query, k)
+
+class IVFSearcher:
+    """
+    Inverted-file index: rows are bucketed by their nearest k-means centroid and a
+    query only scans the n_probe buckets whose centroids are closest to it.
+    Args:
+        matrix: Unit-normalized vectors, one per row.
+        n_lists: Number of buckets. Defaults to about 4 * sqrt(rows).
+        n_probe: Buckets scanned per query unless overridden in search().
+        seed: Seed for centroid initialisation, so builds are reproducible.
+        codes, scale: Optional quantized copy of matrix from quantization.quantize; when
+            given, probed buckets are scored from it and matrix is only read while building.
+    """
+
+    def __init__(self, matrix, n_lists=None, n_probe=DEFAULT_N_PROBE, seed=0, codes=None, scale=None):
+        self.matrix = matrix
+        self.codes = codes
+        self.scale = scale
+        self.n_probe = n_probe
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(matrix))))
+        self.n_lists = min(n_lists, len(matrix))
+        rng = np.random.default_rng(seed)
+
+        sample = matrix
+        if len(matrix) > KMEANS_SAMPLE:
+            sample = matrix[np.sort(rng.choice(len(matrix), KMEANS_SAMPLE, replace=False))]
+        self.centroids = self._train(sample, rng)
+
+        assignments = self._assign(matrix)
+        self.order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=self.n_lists)
+        self.list_offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def _assign(self, data):
+        # Blocked so the block x n_lists score matrix stays small
+        assignments = np.empty(len(data), dtype=np.int64)
+        for start in range(0, len(data), ASSIGN_BLOCK):
+            block = data[start:start + ASSIGN_BLOCK]
+            assignments[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def _train(self, data, rng):
+        """Spherical k-means: centroids stay unit length so assignment is by cosine."""
+        self.centroids = data[rng.choice(len(data), self.n_lists, replace=False)].astype(np.float32)
+        for _ in range(KMEANS_ITERATIONS):
+            assignments = self._assign(data)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=self.n_lists)
+            occupied = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[occupied]
+            sums = np.add.reduceat(data[order], starts, axis=0)
+            self.centroids[occupied] = normalize_rows(sums)
+            # Re-seed empty buckets from random rows so no list is wasted
+            empty = np.flatnonzero(~occupied)
+            if len(empty):
+                self.centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+        return self.centroids
+
+    def search(self, query, k, n_probe=None):
+        """
+        Returns:
+            (row indices, scores) of the best k rows found in the probed buckets, best first.
+        """
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        lists, _ = select_top_k(self.centroids @ query, n_probe)
+        candidates = np.concatenate([
+            self.order[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists
+        ])
+        if self.codes is None:
+            scores = self.matrix[candidates] @ query
+        else:
+            scores = max_scores(self.codes[candidates], self.scale, query[np.newaxis])
+        positions, scores = select_top_k(scores, k)
+        return candidates[positions], scores
+
+def build_searcher(matrix, threshold=ANN_THRESHOLD, **options):
+    """
+    Picks exact search for small matrices and an IVF index above threshold rows.
+    Extra options are passed to IVFSearcher.
+    """
+    if len(matrix) < threshold:
+        return ExactSearcher(matrix)
+    return IVFSearcher(matrix, **options)
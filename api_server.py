@@ -0,0 +1,300 @@
+"""
+HTTP API for the evaluator, so other systems can submit proposals without the web page.
+
+Usage:
+    python api_server.py --host 127.0.0.1 --port 8000 --database database
+
+Endpoints (PDFs are sent as the raw request body, or as a multipart "file" field):
+    POST /v1/evaluate?backend=gemini&use_cache=true   full analysis of one PDF; add narrow_novelty=true
+                                                      to embed-compare only lexically similar documents
+    POST /v1/novelty?k=3&backend=gemini               most similar database documents
+    POST /v1/batch                                    multipart "files"; queues each PDF, returns job IDs
+    GET  /v1/jobs/{id}                                status and, once done, result of a batch job
+    GET  /health
+
+Requests are served on one event loop and the blocking work runs on threads, so
+waiting requests cost no thread. Every request shares one model object and embedding
+client per process, whose upstream connections are reused. Once MAX_CONCURRENT
+requests are running and MAX_WAITING more are waiting, further ones get a 429 with
+Retry-After instead of piling up.
+"""
+import argparse
+import asyncio
+import functools
+import os
+import sys
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import metrics
+from embedding_backends import BACKENDS
+from evaluation_schema import parse_evaluation
+from job_queue import JobQueue, QUEUED
+from novelty_checker import check_novelty
+from pdf_reader import read_pdf_cached
+from pipeline import AnalysisResources, analysis_handler, analyze_pdf
+
+# Evaluation and novelty requests served at the same time; set API_MAX_CONCURRENT to change it
+MAX_CONCURRENT = int(os.environ.get("API_MAX_CONCURRENT", 8))
+# Requests allowed to wait for a slot before new ones are refused with 429
+MAX_WAITING = int(os.environ.get("API_MAX_WAITING", 16))
+# Batch submissions are refused while this many jobs are already queued
+MAX_QUEUED_JOBS = int(os.environ.get("API_MAX_QUEUED_JOBS", 200))
+# Batch jobs of the API, kept apart from the app's queue: a job carries no database folder or
+# API key, so it must be run by a worker of the process that accepted it
+JOBS_PATH = os.path.join(".cache", "api_jobs.sqlite3")
+# Largest accepted PDF
+MAX_UPLOAD_BYTES = int(os.environ.get("API_MAX_UPLOAD_MB", 20)) * 2 ** 20
+# Seconds a refused client is asked to wait before retrying
+RETRY_AFTER_SECONDS = 5
+MAX_K = 50
+
+class HTTPError(Exception):
+    """Turned into a JSON error response with the given status and headers."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers
+
+class ConcurrencyLimit:
+    """
+    Lets limit requests run at once and backlog more wait for a slot; beyond that,
+    requests are refused at once. Requests are admitted before their upload is read,
+    so the limit also bounds the memory held by uploads. Used from the event loop
+    only, so needs no lock.
+
+        async with limit.admit():
+            data = await request.body()
+            async with limit.slot():
+                ...
+    """
+
+    def __init__(self, limit, backlog):
+        self.limit = limit
+        self.backlog = backlog
+        self.admitted = 0
+        self._slots = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def admit(self):
+        """Counts the request as in progress, or refuses it with 429 if too many already are."""
+        if self.admitted >= self.limit + self.backlog:
+            metrics.count("api_rejected", reason="concurrency")
+            raise HTTPError(429, "Too many requests in progress, retry later",
+                            {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.admitted -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Waits for one of the limit running slots; only call it inside admit()."""
+        async with self._slots:
+            yield
+
+def _flag(request, name, default):
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+def _backend(request):
+    name = request.query_params.get("backend", "gemini")
+    if name not in BACKENDS:
+        raise HTTPError(400, f"Unknown backend {name!r}; expected one of {', '.join(sorted(BACKENDS))}")
+    return name
+
+def _check_pdf(data):
+    if not data:
+        raise HTTPError(400, "Send a PDF as the request body or as a multipart 'file' field")
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPError(413, f"PDF larger than {MAX_UPLOAD_BYTES // 2 ** 20} MB")
+    return data
+
+async def _pdf_upload(request):
+    """Returns (filename, bytes) of the PDF in the request."""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        async with request.form(max_files=1) as form:
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPError(400, "Multipart requests need a 'file' field")
+            return upload.filename or "", _check_pdf(await upload.read())
+    # Refuse oversized bodies before reading them
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES:
+        raise HTTPError(413, f"PDF larger than {MAX_UPLOAD_BYTES // 2 ** 20} MB")
+    return request.query_params.get("filename", ""), _check_pdf(await request.body())
+
+def _read_text(data):
+    text = read_pdf_cached(data)
+    if text.startswith("Error reading PDF file"):
+        raise HTTPError(422, text)
+    return text
+
+def _handle_errors(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        try:
+            return await endpoint(request)
+        except HTTPError as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status, headers=e.headers)
+    return wrapper
+
+def _analyze(data, resources, backend, use_cache, narrow_novelty):
+    try:
+        return analyze_pdf(data, resources, backend, use_cache, narrow_novelty=narrow_novelty)
+    finally:
+        metrics.write_prometheus()
+
+@_handle_errors
+async def evaluate(request):
+    backend = _backend(request)
+    limit = request.app.state.limit
+    async with limit.admit():
+        _, data = await _pdf_upload(request)
+        async with limit.slot():
+            try:
+                analysis = await run_in_threadpool(_analyze, data, request.app.state.resources, backend,
+                                                   _flag(request, "use_cache", True),
+                                                   _flag(request, "narrow_novelty", False))
+            except ValueError as e:
+                raise HTTPError(422, str(e))
+    # Also return the evaluation parsed, so clients need not decode the model's JSON text
+    try:
+        analysis["evaluation"] = parse_evaluation(analysis["evaluation_result_text"]).to_dict()
+        analysis["evaluation_error"] = None
+    except ValueError as e:
+        analysis["evaluation"] = None
+        analysis["evaluation_error"] = str(e)
+    return JSONResponse(analysis)
+
+def _novelty(data, resources, backend, k):
+    text = _read_text(data)
+    index, novelty_backend = resources.novelty(backend)
+    return check_novelty(text, resources.database_folder, resources.api_key, k=k, index=index,
+                         backend=novelty_backend)
+
+@_handle_errors
+async def novelty(request):
+    backend = _backend(request)
+    try:
+        k = int(request.query_params.get("k", 3))
+    except ValueError:
+        k = 0
+    if not 1 <= k <= MAX_K:
+        raise HTTPError(400, f"k must be an integer from 1 to {MAX_K}")
+    limit = request.app.state.limit
+    async with limit.admit():
+        _, data = await _pdf_upload(request)
+        async with limit.slot():
+            matches = await run_in_threadpool(_novelty, data, request.app.state.resources, backend, k)
+    return JSONResponse({"matches": [{"similarity": score, "filename": filename} for score, filename in matches]})
+
+@_handle_errors
+async def batch(request):
+    backend = _backend(request)
+    params = {"backend": backend, "use_cache": _flag(request, "use_cache", True),
+              "narrow_novelty": _flag(request, "narrow_novelty", False)}
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPError(400, "Send the PDFs as multipart 'files' fields")
+    queue = request.app.state.queue
+
+    async def refuse_if_full(adding):
+        queued = (await run_in_threadpool(queue.counts)).get(QUEUED, 0)
+        if queued + adding > MAX_QUEUED_JOBS:
+            metrics.count("api_rejected", reason="queue_full")
+            raise HTTPError(429, f"{queued} jobs are already queued, retry later",
+                            {"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    async with request.app.state.limit.admit():
+        # Checked before the upload is read too, so a full queue costs the client no transfer
+        await refuse_if_full(1)
+        async with request.form(max_files=MAX_QUEUED_JOBS) as form:
+            uploads = [upload for upload in form.getlist("files") if not isinstance(upload, str)]
+            if not uploads:
+                raise HTTPError(400, "Multipart requests need at least one 'files' field")
+            await refuse_if_full(len(uploads))
+            # Every file is checked before any is queued, so a rejected batch queues nothing
+            files = [(upload.filename or "", _check_pdf(await upload.read())) for upload in uploads]
+        jobs = []
+        for filename, data in files:
+            job_id = await run_in_threadpool(queue.submit, data, filename, params)
+            jobs.append({"id": job_id, "filename": filename, "status_url": str(request.url_for("job", job_id=job_id))})
+    return JSONResponse({"jobs": jobs}, status_code=202)
+
+@_handle_errors
+async def job(request):
+    found = await run_in_threadpool(request.app.state.queue.get, request.path_params["job_id"])
+    if found is None:
+        raise HTTPError(404, "Unknown job")
+    return JSONResponse(found._asdict())
+
+async def health(request):
+    counts = await run_in_threadpool(request.app.state.queue.counts)
+    return JSONResponse({"status": "ok", "in_flight": request.app.state.limit.admitted, "jobs": counts})
+
+def create_app(database_folder, api_key, max_concurrent=MAX_CONCURRENT, max_waiting=MAX_WAITING, workers=None,
+               jobs_path=JOBS_PATH):
+    """
+    Args:
+        database_folder: Folder of past proposals.
+        api_key: Google API key.
+        max_concurrent, max_waiting: Request limits; see ConcurrencyLimit.
+        workers: Batch jobs run at the same time. Defaults to job_queue.DEFAULT_WORKERS.
+        jobs_path: SQLite file of the batch jobs; only this server's processes may share it.
+    Returns:
+        The ASGI application; batch workers start and stop with it.
+    """
+    resources = AnalysisResources(database_folder, api_key)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.resources = resources
+        app.state.limit = ConcurrencyLimit(max_concurrent, max_waiting)
+        queue_args = {} if workers is None else {"workers": workers}
+        app.state.queue = JobQueue(analysis_handler(resources), jobs_path, **queue_args).start()
+        try:
+            yield
+        finally:
+            await run_in_threadpool(app.state.queue.stop)
+
+    return Starlette(routes=[
+        Route("/v1/evaluate", evaluate, methods=["POST"]),
+        Route("/v1/novelty", novelty, methods=["POST"]),
+        Route("/v1/batch", batch, methods=["POST"]),
+        Route("/v1/jobs/{job_id}", job, methods=["GET"], name="job"),
+        Route("/health", health, methods=["GET"]),
+    ], lifespan=lifespan)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the R&D proposal evaluator over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--database", default="database", help="Folder of past proposals for the novelty check")
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT,
+                        help="Evaluation and novelty requests served at the same time")
+    parser.add_argument("--max-waiting", type=int, default=MAX_WAITING,
+                        help="Requests that may wait for a slot before others get 429")
+    parser.add_argument("--metrics-log", help="Append one JSON line per timed operation to this file")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if args.metrics_log:
+        metrics.configure_logging(args.metrics_log)
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        print("Error: GOOGLE_API_KEY not found in .env file.")
+        return 1
+
+    import uvicorn
+    uvicorn.run(create_app(args.database, api_key, args.max_concurrent, args.max_waiting),
+                host=args.host, port=args.port)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
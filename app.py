@@ -1,15 +1,14 @@
 import streamlit as st
+import functools
 import os
 import json
-import pandas as pd
-import io
-import plotly.graph_objects as go
-import plotly.express as px
 from dotenv import load_dotenv
-from fpdf import FPDF
-from pdf_reader import read_pdf
-from evaluator import get_gemini_response
-from novelty_checker import check_novelty
+# pandas, plotly, fpdf, the Gemini SDK and the analysis pipeline are imported where they
+# are used, so the upload page paints without waiting for them
+from job_queue import JobQueue, DONE, FAILED, FINISHED, QUEUED, RUNNING
+from evaluation_schema import parse_evaluation
+from text_cache import sha256_bytes
+import metrics
 from datetime import datetime
 
 # Custom CSS for beautiful styling
@@ -268,39 +267,46 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
-# Helper class for PDF generation with enhanced styling
-class PDF(FPDF):
-    def header(self):
-        self.set_fill_color(102, 126, 234)
-        self.rect(0, 0, 210, 30, 'F')
-        self.set_text_color(255, 255, 255)
-        self.set_font('Arial', 'B', 16)
-        self.set_y(10)
-        self.cell(0, 10, 'R&D Proposal Screening Report', 0, 1, 'C')
-        self.set_font('Arial', '', 10)
-        self.cell(0, 5, f'Generated: {datetime.now().strftime("%B %d, %Y")}', 0, 1, 'C')
-        self.ln(10)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.set_text_color(128, 128, 128)
-        self.cell(0, 10, f'Page {self.page_no()} | Powered by AI Analysis', 0, 0, 'C')
-
-    def chapter_title(self, title):
-        self.set_font('Arial', 'B', 14)
-        self.set_text_color(102, 126, 234)
-        self.cell(0, 10, title, 0, 1, 'L')
-        self.set_text_color(0, 0, 0)
-        self.ln(3)
-
-    def chapter_body(self, body):
-        self.set_font('Arial', '', 11)
-        self.multi_cell(0, 6, body)
-        self.ln(5)
+# Helper class for PDF generation with enhanced styling, built on first export
+# so fpdf is only imported when a report is actually downloaded
+@functools.lru_cache(maxsize=None)
+def pdf_class():
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        def header(self):
+            self.set_fill_color(102, 126, 234)
+            self.rect(0, 0, 210, 30, 'F')
+            self.set_text_color(255, 255, 255)
+            self.set_font('Arial', 'B', 16)
+            self.set_y(10)
+            self.cell(0, 10, 'R&D Proposal Screening Report', 0, 1, 'C')
+            self.set_font('Arial', '', 10)
+            self.cell(0, 5, f'Generated: {datetime.now().strftime("%B %d, %Y")}', 0, 1, 'C')
+            self.ln(10)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.set_text_color(128, 128, 128)
+            self.cell(0, 10, f'Page {self.page_no()} | Powered by AI Analysis', 0, 0, 'C')
+
+        def chapter_title(self, title):
+            self.set_font('Arial', 'B', 14)
+            self.set_text_color(102, 126, 234)
+            self.cell(0, 10, title, 0, 1, 'L')
+            self.set_text_color(0, 0, 0)
+            self.ln(3)
+
+        def chapter_body(self, body):
+            self.set_font('Arial', '', 11)
+            self.multi_cell(0, 6, body)
+            self.ln(5)
+
+    return PDF
 
 def create_pdf_report(report_text):
-    pdf = PDF()
+    pdf = pdf_class()()
     pdf.add_page()
     
     # Split report into sections and format nicely
@@ -319,6 +325,7 @@ def create_pdf_report(report_text):
 
 def create_gauge_chart(value, title, color):
     """Create a beautiful gauge chart for scores"""
+    import plotly.graph_objects as go
     fig = go.Figure(go.Indicator(
         mode = "gauge+number+delta",
         value = value,
@@ -356,6 +363,7 @@ def create_gauge_chart(value, title, color):
 
 def create_radar_chart(scores):
     """Create a radar chart for evaluation scores"""
+    import plotly.graph_objects as go
     categories = list(scores.keys())
     values = list(scores.values())
     
@@ -387,8 +395,58 @@ def create_radar_chart(scores):
     
     return fig
 
+@st.cache_resource
+def get_job_queue():
+    """Background workers that run every session's analyses; jobs and their results are kept in SQLite"""
+    from pipeline import AnalysisResources, analysis_handler
+    # The key is held by the workers' resources, never written into a job's params
+    return JobQueue(analysis_handler(AnalysisResources('database', os.getenv("GOOGLE_API_KEY")))).start()
+
+def job_queue():
+    """The job queue, started on first use: only Analyze or a ?job= link needs it, never the upload page"""
+    st.session_state["job_queue_started"] = True
+    return get_job_queue()
+
+def live_preview_lines(partial):
+    """Markdown lines for the evaluation fields the model has written so far"""
+    lines = []
+    for key, value in (partial or {}).items():
+        if key.endswith('_score') and isinstance(value, dict):
+            criterion = key.replace('_score', '').title()
+            lines.append(f"**{criterion}: {value.get('score')}/10** — {value.get('justification', '')}")
+        elif key in ('strengths', 'weaknesses'):
+            lines.append(f"**{key.title()}:** {value}")
+    return lines
+
+def show_near_duplicates(matches):
+    """Flags archived proposals whose wording this one largely repeats"""
+    for overlap, filename in matches:
+        st.error(f"⚠️ Near-duplicate of **{filename}**: about {overlap:.0%} of its wording matches this proposal.")
+
+@st.fragment(run_every=1)
+def show_job_progress(job_id):
+    """Polls a queued or running job, redrawing only this block until the job finishes"""
+    job = job_queue().get(job_id)
+    if job is None or job.status in FINISHED:
+        st.rerun()
+    if job.status == QUEUED:
+        ahead = job_queue().position(job_id)
+        st.info(f"⏳ Waiting in the queue ({ahead} analyses ahead of this one)...")
+        return
+    partial = job.partial or {}
+    # The offline duplicate check finishes first, so its warning comes before any score
+    show_near_duplicates(partial.get("near_duplicates", []))
+    st.progress(job.progress)
+    st.text(job.message or "🔬 Analyzing...")
+    # Live preview of the evaluation while the model is still writing it
+    live_lines = live_preview_lines(partial.get("evaluation"))
+    if live_lines:
+        st.info("\n\n".join(live_lines))
+
 # Load environment variables
 load_dotenv()
+# JSON metric events go to METRICS_LOG if set, otherwise to stderr
+metrics.configure_logging(os.getenv("METRICS_LOG"))
 
 # Page configuration
 st.set_page_config(
@@ -427,6 +485,31 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### 📈 Analysis Parameters")
     similarity_threshold = st.slider("Similarity Threshold", 0.0, 1.0, 0.7, 0.05)
+    embedding_backend = st.selectbox(
+        "Novelty embeddings",
+        ["gemini", "local"],
+        format_func=lambda name: {"gemini": "Gemini (online)", "local": "Local hashing (offline)"}[name],
+        help="The local backend needs no network and is much faster, but only matches shared vocabulary"
+    )
+    narrow_novelty = st.checkbox(
+        "Only compare lexically similar proposals",
+        value=False,
+        help="Skip the embedding comparison for archived proposals with no wording in common; "
+             "faster, but misses paraphrased overlap"
+    )
+    stream_evaluation = st.checkbox(
+        "Stream AI output live",
+        value=True,
+        help="Show each score as soon as the model has written it"
+    )
+    use_cached_evaluation = st.checkbox(
+        "Reuse cached AI evaluations",
+        value=True,
+        help="Untick to ask the model for a fresh opinion on a proposal it has already scored"
+    )
+    
+    # Filled in at the end of the run, once this session has started the queue
+    queue_status = st.empty()
     
     st.markdown("---")
     st.markdown("### ℹ️ About")
@@ -450,16 +533,28 @@ with upload_col2:
         help="Select a PDF file containing your R&D proposal for analysis"
     )
 
+# A link with ?job=<id> brings a submitted analysis back, e.g. after a reconnect or in another tab
+restored_job = None
+if not uploaded_file and "job" in st.query_params:
+    restored_job = job_queue().get(st.query_params["job"])
+
 # Analysis button and process
-if uploaded_file:
+if uploaded_file or restored_job:
     st.markdown("---")
     
     # Show file info
-    file_details = {
-        "Filename": uploaded_file.name,
-        "File Size": f"{uploaded_file.size / 1024:.2f} KB",
-        "File Type": uploaded_file.type
-    }
+    if uploaded_file:
+        file_details = {
+            "Filename": uploaded_file.name,
+            "File Size": f"{uploaded_file.size / 1024:.2f} KB",
+            "File Type": uploaded_file.type
+        }
+    else:
+        file_details = {
+            "Filename": restored_job.filename,
+            "Submitted": datetime.fromtimestamp(restored_job.created).strftime("%Y-%m-%d %H:%M"),
+            "Status": restored_job.status.title()
+        }
     
     col1, col2, col3 = st.columns(3)
     for i, (key, value) in enumerate(file_details.items()):
@@ -468,133 +563,136 @@ if uploaded_file:
     
     st.markdown("---")
     
-    # Center the analyze button
-    col1, col2, col3 = st.columns([1, 1, 1])
-    with col2:
-        analyze_button = st.button("🔍 ANALYZE PROPOSAL", use_container_width=True)
-    
-    if analyze_button:
-        if not api_key:
-            st.error("⚠️ GOOGLE_API_KEY not found. Please create a .env file with your key.")
-        else:
-            # Progress bar
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+    if uploaded_file:
+        file_bytes = uploaded_file.getvalue()
+        file_hash = sha256_bytes(file_bytes)
+        # Jobs of this session by file, so widgets and downloads never redo an analysis
+        jobs = st.session_state.setdefault("jobs", {})
+        
+        # Center the analyze button
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col2:
+            analyze_button = st.button("🔍 ANALYZE PROPOSAL", use_container_width=True)
+        
+        if analyze_button:
+            if not api_key:
+                st.error("⚠️ GOOGLE_API_KEY not found. Please create a .env file with your key.")
+            else:
+                # The analysis runs on a background worker, so it survives reruns and reconnects
+                jobs[file_hash] = job_queue().submit(file_bytes, uploaded_file.name, {
+                    "backend": embedding_backend,
+                    "use_cache": use_cached_evaluation,
+                    "stream": stream_evaluation,
+                    "narrow_novelty": narrow_novelty,
+                })
+                st.query_params["job"] = jobs[file_hash]
+        
+        job = job_queue().get(jobs[file_hash]) if file_hash in jobs else None
+    else:
+        job = restored_job
+    
+    if job and job.status not in FINISHED:
+        show_job_progress(job.id)
+    elif job and job.status == FAILED:
+        st.error(job.error)
+    
+    analysis = job.result if job and job.status == DONE else None
+    if analysis:
+        # Tables are only drawn once there are results, so pandas waits until then
+        import pandas as pd
+        top_matches = analysis["top_matches"]
+        evaluation_result_text = analysis["evaluation_result_text"]
+        show_near_duplicates(analysis["near_duplicates"])
+        if analysis.get("metrics"):
+            with st.sidebar:
+                st.markdown("---")
+                st.markdown("### ⏱️ Where the Time Went")
+                breakdown = pd.DataFrame.from_dict(analysis["metrics"], orient="index")
+                breakdown["seconds"] = breakdown["seconds"].round(3)
+                st.dataframe(breakdown.sort_values("seconds", ascending=False), use_container_width=True)
+        if analysis.get("duplicates_error"):
+            st.warning(f"Near-duplicate check failed, continuing without it: {analysis['duplicates_error']}")
+        if analysis["novelty_error"]:
+            st.warning(f"Novelty check failed, continuing without it: {analysis['novelty_error']}")
+        elif analysis.get("novelty_note"):
+            st.info(analysis["novelty_note"])
+        
+        # Display results in tabs
+        st.markdown("---")
+        st.markdown("## 📊 Analysis Results")
+        
+        tab1, tab2, tab3, tab4 = st.tabs(["📈 Overview", "🎯 Scores", "📝 Detailed Analysis", "📥 Export"])
+        
+        # Validate the response against the evaluation schema
+        try:
+            data = parse_evaluation(evaluation_result_text).to_dict()
             
-            with st.spinner():
-                # Stage 1: Reading PDF
-                status_text.text("📖 Reading PDF document...")
-                progress_bar.progress(20)
+            with tab1:
+                # Overview metrics
+                st.markdown("### 🎯 Key Metrics")
                 
-                file_bytes = uploaded_file.getvalue()
-                file_stream = io.BytesIO(file_bytes)
-                proposal_text = read_pdf(file_stream)
+                col1, col2, col3, col4 = st.columns(4)
                 
-                if "Error reading PDF file" in proposal_text:
-                    st.error(proposal_text)
-                    progress_bar.empty()
-                    status_text.empty()
-                else:
-                    # Stage 2: Novelty Check
-                    status_text.text("🔬 Checking novelty against database...")
-                    progress_bar.progress(50)
-                    top_matches = check_novelty(proposal_text, 'database', api_key)
-                    
-                    # Stage 3: AI Evaluation
-                    status_text.text("🤖 Performing deep AI analysis...")
-                    progress_bar.progress(80)
-                    evaluation_result_text = get_gemini_response(api_key, proposal_text)
-                    
-                    # Complete
-                    progress_bar.progress(100)
-                    status_text.text("✅ Analysis complete!")
-                    
-                    # Clear progress indicators
-                    progress_bar.empty()
-                    status_text.empty()
-                    
-                    # Display results in tabs
-                    st.markdown("---")
-                    st.markdown("## 📊 Analysis Results")
-                    
-                    tab1, tab2, tab3, tab4 = st.tabs(["📈 Overview", "🎯 Scores", "📝 Detailed Analysis", "📥 Export"])
-                    
-                    # Parse JSON response
-                    json_string = evaluation_result_text
-                    if '```json' in evaluation_result_text:
-                        start_index = evaluation_result_text.find('{')
-                        end_index = evaluation_result_text.rfind('}') + 1
-                        json_string = evaluation_result_text[start_index:end_index]
-                    
-                    try:
-                        data = json.loads(json_string)
-                        
-                        with tab1:
-                            # Overview metrics
-                            st.markdown("### 🎯 Key Metrics")
-                            
-                            col1, col2, col3, col4 = st.columns(4)
-                            
-                            with col1:
-                                originality_score = (1 - top_matches[0][0]) * 100 if top_matches else 0
-                                st.metric(
-                                    "Originality",
-                                    f"{originality_score:.1f}%",
-                                    f"vs {top_matches[0][1][:20]}..." if top_matches else "N/A"
-                                )
-                            
-                            with col2:
-                                avg_score = (data['clarity_score']['score'] + 
-                                           data['novelty_score']['score'] + 
-                                           data['feasibility_score']['score']) / 3
-                                st.metric(
-                                    "Average Score",
-                                    f"{avg_score:.1f}/10",
-                                    f"{(avg_score - 5):.1f}" if avg_score != 5 else "0"
-                                )
-                            
-                            with col3:
-                                st.metric(
-                                    "Highest Score",
-                                    f"{max(data['clarity_score']['score'], data['novelty_score']['score'], data['feasibility_score']['score'])}/10",
-                                    "✨ Excellent" if max(data['clarity_score']['score'], data['novelty_score']['score'], data['feasibility_score']['score']) >= 8 else "Good"
-                                )
-                            
-                            with col4:
-                                st.metric(
-                                    "Areas to Improve",
-                                    f"{sum(1 for s in [data['clarity_score']['score'], data['novelty_score']['score'], data['feasibility_score']['score']] if s < 7)}",
-                                    "aspects" if sum(1 for s in [data['clarity_score']['score'], data['novelty_score']['score'], data['feasibility_score']['score']] if s < 7) > 0 else "None"
-                                )
-                            
-                            # Similarity matches
-                            if top_matches:
-                                st.markdown("### 🔍 Similarity Analysis")
-                                similarity_data = pd.DataFrame(
-                                    [(f"{(1-score)*100:.1f}%", name[:50]) for score, name in top_matches[:5]],
-                                    columns=["Uniqueness", "Similar Project"]
-                                )
-                                st.dataframe(similarity_data, use_container_width=True, hide_index=True)
-                        
-                        with tab2:
-                            st.markdown("### 📊 Evaluation Scores")
-                            
-                            scores = {
-                                'Clarity': data['clarity_score']['score'],
-                                'Novelty': data['novelty_score']['score'],
-                                'Feasibility': data['feasibility_score']['score']
-                            }
-                            
-                            # Radar chart
-                            col1, col2 = st.columns([2, 1])
-                            with col1:
-                                st.plotly_chart(create_radar_chart(scores), use_container_width=True)
-                            
-                            with col2:
-                                st.markdown("#### Score Breakdown")
-                                for criterion, score in scores.items():
-                                    color = "#10B981" if score >= 7 else "#F59E0B" if score >= 5 else "#EF4444"
-                                    st.markdown(f"""
+                with col1:
+                    originality_score = (1 - top_matches[0][0]) * 100 if top_matches else 0
+                    st.metric(
+                        "Originality",
+                        f"{originality_score:.1f}%",
+                        f"vs {top_matches[0][1][:20]}..." if top_matches else "N/A"
+                    )
+                
+                with col2:
+                    avg_score = (data['clarity_score']['score'] + 
+                               data['novelty_score']['score'] + 
+                               data['feasibility_score']['score']) / 3
+                    st.metric(
+                        "Average Score",
+                        f"{avg_score:.1f}/10",
+                        f"{(avg_score - 5):.1f}" if avg_score != 5 else "0"
+                    )
+                
+                with col3:
+                    st.metric(
+                        "Highest Score",
+                        f"{max(data['clarity_score']['score'], data['novelty_score']['score'], data['feasibility_score']['score'])}/10",
+                        "✨ Excellent" if max(data['clarity_score']['score'], data['novelty_score']['score'], data['feasibility_score']['score']) >= 8 else "Good"
+                    )
+                
+                with col4:
+                    st.metric(
+                        "Areas to Improve",
+                        f"{sum(1 for s in [data['clarity_score']['score'], data['novelty_score']['score'], data['feasibility_score']['score']] if s < 7)}",
+                        "aspects" if sum(1 for s in [data['clarity_score']['score'], data['novelty_score']['score'], data['feasibility_score']['score']] if s < 7) > 0 else "None"
+                    )
+                
+                # Similarity matches
+                if top_matches:
+                    st.markdown("### 🔍 Similarity Analysis")
+                    similarity_data = pd.DataFrame(
+                        [(f"{(1-score)*100:.1f}%", name[:50]) for score, name in top_matches[:5]],
+                        columns=["Uniqueness", "Similar Project"]
+                    )
+                    st.dataframe(similarity_data, use_container_width=True, hide_index=True)
+            
+            with tab2:
+                st.markdown("### 📊 Evaluation Scores")
+                
+                scores = {
+                    'Clarity': data['clarity_score']['score'],
+                    'Novelty': data['novelty_score']['score'],
+                    'Feasibility': data['feasibility_score']['score']
+                }
+                
+                # Radar chart
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    st.plotly_chart(create_radar_chart(scores), use_container_width=True)
+                
+                with col2:
+                    st.markdown("#### Score Breakdown")
+                    for criterion, score in scores.items():
+                        color = "#10B981" if score >= 7 else "#F59E0B" if score >= 5 else "#EF4444"
+                        st.markdown(f"""
                                         <div style="background: linear-gradient(90deg, {color}22 0%, {color}11 100%); 
                                                     padding: 1rem; border-radius: 8px; margin: 0.5rem 0;
                                                     border-left: 4px solid {color};">
@@ -603,27 +701,27 @@ if uploaded_file:
                                             <span style="color: #718096;">/10</span>
                                         </div>
                                     """, unsafe_allow_html=True)
-                            
-                            # Individual gauge charts
-                            if show_advanced:
-                                st.markdown("---")
-                                st.markdown("### 🎯 Detailed Score Visualization")
-                                cols = st.columns(3)
-                                colors = ["#667EEA", "#F56565", "#48BB78"]
-                                for i, (criterion, score) in enumerate(scores.items()):
-                                    with cols[i]:
-                                        st.plotly_chart(
-                                            create_gauge_chart(score, criterion, colors[i]),
-                                            use_container_width=True
-                                        )
-                        
-                        with tab3:
-                            st.markdown("### 📝 Detailed Analysis")
-                            
-                            # Justifications in expandable sections
-                            with st.expander("🎯 Score Justifications", expanded=True):
-                                for criterion in ['clarity_score', 'novelty_score', 'feasibility_score']:
-                                    st.markdown(f"""
+                
+                # Individual gauge charts
+                if show_advanced:
+                    st.markdown("---")
+                    st.markdown("### 🎯 Detailed Score Visualization")
+                    cols = st.columns(3)
+                    colors = ["#667EEA", "#F56565", "#48BB78"]
+                    for i, (criterion, score) in enumerate(scores.items()):
+                        with cols[i]:
+                            st.plotly_chart(
+                                create_gauge_chart(score, criterion, colors[i]),
+                                use_container_width=True
+                            )
+            
+            with tab3:
+                st.markdown("### 📝 Detailed Analysis")
+                
+                # Justifications in expandable sections
+                with st.expander("🎯 Score Justifications", expanded=True):
+                    for criterion in ['clarity_score', 'novelty_score', 'feasibility_score']:
+                        st.markdown(f"""
                                         <div style="background: #F7FAFC; padding: 1rem; border-radius: 8px; margin: 1rem 0;">
                                             <h4 style="color: #2D3748; margin-bottom: 0.5rem;">
                                                 {criterion.replace('_score', '').title()}
@@ -633,40 +731,46 @@ if uploaded_file:
                                             </p>
                                         </div>
                                     """, unsafe_allow_html=True)
-                            
-                            # Strengths and Weaknesses
-                            col1, col2 = st.columns(2)
-                            
-                            with col1:
-                                st.markdown("""
-                                    <div style="background: linear-gradient(135deg, #D4EDDA 0%, #C3E6CB 100%); 
-                                                padding: 1.5rem; border-radius: 12px;">
-                                        <h3 style="color: #155724;">💪 Strengths</h3>
-                                    </div>
-                                """, unsafe_allow_html=True)
-                                st.markdown(data['strengths'])
-                            
-                            with col2:
-                                st.markdown("""
-                                    <div style="background: linear-gradient(135deg, #F8D7DA 0%, #F5C6CB 100%); 
-                                                padding: 1.5rem; border-radius: 12px;">
-                                        <h3 style="color: #721C24;">⚠️ Weaknesses</h3>
-                                    </div>
-                                """, unsafe_allow_html=True)
-                                st.markdown(data['weaknesses'])
-                        
-                        with tab4:
-                            st.markdown("### 📥 Export Options")
-                            
-                            # Prepare report
-                            report_text = f"""
+                
+                # Strengths and Weaknesses
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.markdown("""
+                        <div style="background: linear-gradient(135deg, #D4EDDA 0%, #C3E6CB 100%); 
+                                    padding: 1.5rem; border-radius: 12px;">
+                            <h3 style="color: #155724;">💪 Strengths</h3>
+                        </div>
+                    """, unsafe_allow_html=True)
+                    st.markdown(data['strengths'])
+                
+                with col2:
+                    st.markdown("""
+                        <div style="background: linear-gradient(135deg, #F8D7DA 0%, #F5C6CB 100%); 
+                                    padding: 1.5rem; border-radius: 12px;">
+                            <h3 style="color: #721C24;">⚠️ Weaknesses</h3>
+                        </div>
+                    """, unsafe_allow_html=True)
+                    st.markdown(data['weaknesses'])
+            
+            with tab4:
+                st.markdown("### 📥 Export Options")
+                
+                # Prepare report
+                if top_matches:
+                    originality_section = (
+                        f"Originality vs. Database: {(1 - top_matches[0][0]) * 100:.1f}% Original\n"
+                        f"Most similar file: {top_matches[0][1]} ({top_matches[0][0]*100:.1f}% similar)"
+                    )
+                else:
+                    originality_section = "Originality vs. Database: not available"
+                report_text = f"""
 R&D PROPOSAL SCREENING REPORT
 ============================================
 
 ORIGINALITY ASSESSMENT
 --------------------------------------------
-Originality vs. Database: {(1 - top_matches[0][0]) * 100:.1f}% Original
-Most similar file: {top_matches[0][1]} ({top_matches[0][0]*100:.1f}% similar)
+{originality_section}
 
 EVALUATION SCORES
 --------------------------------------------
@@ -700,41 +804,44 @@ Based on the analysis, this proposal shows {
     'limited potential'
 } for R&D funding consideration.
 """
-                            
-                            # Export buttons
-                            col1, col2 = st.columns(2)
-                            
-                            with col1:
-                                # PDF export
-                                sanitized_report_text = report_text.replace("—", "-").replace("'", "'").replace("'", "'")
-                                pdf_data = create_pdf_report(sanitized_report_text)
-                                
-                                st.download_button(
-                                    label="📄 Download PDF Report",
-                                    data=pdf_data,
-                                    file_name=f"RD_Screening_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                                    mime="application/pdf",
-                                    use_container_width=True
-                                )
-                            
-                            with col2:
-                                # JSON export
-                                st.download_button(
-                                    label="📊 Download JSON Data",
-                                    data=json.dumps(data, indent=2),
-                                    file_name=f"RD_Analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                                    mime="application/json",
-                                    use_container_width=True
-                                )
-                            
-                            # Preview area
-                            st.markdown("---")
-                            with st.expander("📋 Preview Report"):
-                                st.text(report_text)
+                
+                # Export buttons
+                col1, col2 = st.columns(2)
+                
+                # Payloads are passed as callables so they are only built when a download is
+                # requested, and on_click="ignore" keeps the click from rerunning the script
+                with col1:
+                    # PDF export
+                    sanitized_report_text = report_text.replace("—", "-").replace("'", "'").replace("'", "'")
                     
-                    except (json.JSONDecodeError, KeyError) as e:
-                        st.error(f"Could not parse AI response. Error: {str(e)}")
-                        st.code(json_string)
+                    st.download_button(
+                        label="📄 Download PDF Report",
+                        data=lambda: create_pdf_report(sanitized_report_text),
+                        file_name=f"RD_Screening_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                        mime="application/pdf",
+                        on_click="ignore",
+                        use_container_width=True
+                    )
+                
+                with col2:
+                    # JSON export
+                    st.download_button(
+                        label="📊 Download JSON Data",
+                        data=lambda: json.dumps(data, indent=2),
+                        file_name=f"RD_Analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                        mime="application/json",
+                        on_click="ignore",
+                        use_container_width=True
+                    )
+                
+                # Preview area
+                st.markdown("---")
+                with st.expander("📋 Preview Report"):
+                    st.text(report_text)
+        
+        except ValueError as e:
+            st.error(f"Could not parse AI response. Error: {str(e)}")
+            st.code(evaluation_result_text)
 else:
     # Landing page when no file is uploaded
     st.markdown("""
@@ -838,6 +945,10 @@ else:
                 </div>
             """, unsafe_allow_html=True)
 
+if st.session_state.get("job_queue_started"):
+    job_counts = job_queue().counts()
+    queue_status.caption(f"🧵 Analysis queue: {job_counts.get(QUEUED, 0)} waiting, {job_counts.get(RUNNING, 0)} running")
+
 # Footer
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,192 @@
+"""
+Headless batch runner: screens every PDF in a folder and streams one JSON line per proposal.
+
+Usage:
+    python batch_evaluate.py proposals/ --output results.jsonl --workers 4
+
+Re-running with the same --output skips proposals that already completed successfully,
+so an interrupted run can simply be started again.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+import metrics
+from embedding_backends import BACKENDS, get_backend
+from near_duplicate import load_near_duplicates
+from novelty_checker import load_index
+from pdf_reader import list_pdfs, read_pdf_cached
+from pipeline import run_analysis
+from text_cache import file_sha256, sha256_bytes
+
+def load_completed(output_path):
+    """Returns the SHA-256 digests of proposals already evaluated successfully."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a truncated last line behind
+                continue
+            if record.get("status") == "ok":
+                completed.add(record["sha256"])
+    return completed
+
+def drop_partial_line(output_path, block_size=65536):
+    """Truncates output_path back to its last newline, so the next record starts on a line of its own."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            # Left by a crash mid-write; load_completed already ignored it, so the record is redone
+            f.truncate(position)
+
+def evaluate_file(path, database_folder, api_key, index, use_cache, near_duplicates=None, backend=None,
+                  narrow_novelty=False):
+    with metrics.collect() as run:
+        record = _evaluate_file(path, database_folder, api_key, index, use_cache, near_duplicates, backend,
+                                narrow_novelty)
+    record["metrics"] = run.breakdown()
+    return record
+
+def _evaluate_file(path, database_folder, api_key, index, use_cache, near_duplicates, backend, narrow_novelty):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        file_bytes = f.read()
+    record = {"file": os.path.basename(path), "sha256": sha256_bytes(file_bytes), "timings": {}}
+
+    proposal_text = read_pdf_cached(file_bytes)
+    record["timings"]["read"] = time.perf_counter() - start
+    if proposal_text.startswith("Error reading PDF file"):
+        record.update(status="error", error=proposal_text)
+        record["timings"]["total"] = time.perf_counter() - start
+        return record
+
+    results = run_analysis(proposal_text, database_folder, api_key, use_cache=use_cache, index=index,
+                           near_duplicates=near_duplicates, narrow_novelty=narrow_novelty, backend=backend)
+    errors = []
+    for stage, result in results.items():
+        record["timings"][stage] = result.seconds
+        if result.error:
+            errors.append(f"{stage}: {result.error}")
+
+    if "duplicates" in results:
+        duplicates = results["duplicates"].value or []
+        record["near_duplicates"] = [{"file": filename, "overlap": overlap} for overlap, filename in duplicates]
+    novelty = results["novelty"].value or []
+    if results["novelty"].note:
+        record["novelty_note"] = results["novelty"].note
+    record["top_matches"] = [{"file": filename, "similarity": score} for score, filename in novelty]
+
+    evaluation_text = results["evaluation"].value
+    if evaluation_text is not None:
+        try:
+            record["evaluation"] = json.loads(evaluation_text)
+            if "error" in record["evaluation"]:
+                errors.append(f"evaluation: {record['evaluation']['error']}")
+        except json.JSONDecodeError as e:
+            record["raw_evaluation"] = evaluation_text
+            errors.append(f"evaluation: could not parse response ({e})")
+
+    record["status"] = "error" if errors else "ok"
+    if errors:
+        record["error"] = "; ".join(errors)
+    record["timings"]["total"] = time.perf_counter() - start
+    return record
+
+def print_summary(records, elapsed):
+    ok = sum(1 for record in records if record["status"] == "ok")
+    print(f"\nProcessed {len(records)} proposals ({ok} ok, {len(records) - ok} failed) in {elapsed:.1f}s")
+    if not records:
+        return
+    print(f"Throughput: {len(records) / elapsed * 60:.1f} proposals/min")
+    print(f"{'stage':<12} {'mean':>8} {'p50':>8} {'p95':>8} {'max':>8}")
+    for stage in ["read", "duplicates", "novelty", "evaluation", "total"]:
+        samples = sorted(record["timings"][stage] for record in records if stage in record["timings"])
+        if not samples:
+            continue
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f"{stage:<12} {statistics.mean(samples):>7.2f}s {statistics.median(samples):>7.2f}s "
+              f"{p95:>7.2f}s {samples[-1]:>7.2f}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen a folder of R&D proposal PDFs.")
+    parser.add_argument("input_folder", help="Folder of proposal PDFs to evaluate")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--database", default="database", help="Folder of past proposals for the novelty check")
+    parser.add_argument("--workers", type=int, default=4, help="Proposals evaluated at the same time")
+    parser.add_argument("--no-cache", action="store_true", help="Ask the model for fresh evaluations")
+    parser.add_argument("--metrics-log", help="Append one JSON line per timed operation to this file")
+    parser.add_argument("--embeddings", choices=sorted(BACKENDS), default="gemini",
+                        help="Embedding backend for the novelty check; 'local' needs no network")
+    parser.add_argument("--narrow-novelty", action="store_true",
+                        help="Only compare embeddings against lexically similar database documents")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if args.metrics_log:
+        metrics.configure_logging(args.metrics_log)
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        print("Error: GOOGLE_API_KEY not found in .env file.")
+        return 1
+
+    completed = load_completed(args.output)
+    drop_partial_line(args.output)
+    paths = list_pdfs(args.input_folder)
+    todo = [path for path in paths if file_sha256(path) not in completed]
+    skipped = len(paths) - len(todo)
+    print(f"{len(todo)} proposals to evaluate, {skipped} already done")
+    if not todo:
+        return 0
+
+    # Build or refresh the database index once, up front, and share it between workers
+    backend = get_backend(args.embeddings, api_key)
+    index = load_index(args.database, api_key, backend=backend)
+    near_duplicates = load_near_duplicates(args.database)
+
+    records = []
+    start = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(evaluate_file, path, args.database, api_key, index, not args.no_cache, near_duplicates,
+                        backend, args.narrow_novelty): path
+            for path in todo
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"file": os.path.basename(path), "sha256": None, "status": "error",
+                          "error": str(e), "timings": {}}
+            # One line per finished proposal, flushed so a crash loses nothing already done
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            records.append(record)
+            print(f"[{len(records)}/{len(todo)}] {record['file']}: {record['status']}")
+
+    print_summary(records, time.perf_counter() - start)
+    metrics.write_prometheus()
+    print(f"Metrics written to {metrics.METRICS_FILE}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
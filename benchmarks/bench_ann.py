@@ -0,0 +1,66 @@
+"""
+Recall-versus-latency benchmark of the IVF index against exact search on
+synthetic, clustered unit vectors (real embeddings are far from uniform, so
+uniform random data would make any ANN index look worse than it is).
+
+Run from the project root:
+    python benchmarks/bench_ann.py --vectors 100000 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import ExactSearcher, IVFSearcher
+from vector_ops import normalize_rows
+
+K = 10
+N_PROBES = [1, 2, 4, 8, 16, 32, 64]
+
+def synthetic_embeddings(n, dim, n_topics, rng):
+    """Vectors scattered around n_topics random directions, like documents on a few hundred subjects."""
+    topics = normalize_rows(rng.standard_normal((n_topics, dim)))
+    labels = rng.integers(0, n_topics, n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * 0.04
+    return normalize_rows(topics[labels] + noise)
+
+def timed_searches(search, queries):
+    start = time.perf_counter()
+    results = [search(query)[0] for query in queries]
+    return results, (time.perf_counter() - start) / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = synthetic_embeddings(args.vectors, args.dim, args.topics, rng)
+    # Queries are perturbed stored vectors, so each has genuine near neighbours
+    picks = rng.choice(args.vectors, args.queries, replace=False)
+    queries = normalize_rows(matrix[picks] + rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 0.02)
+
+    exact = ExactSearcher(matrix)
+    truth, exact_latency = timed_searches(lambda q: exact.search(q, K), queries)
+
+    start = time.perf_counter()
+    ivf = IVFSearcher(matrix)
+    build_time = time.perf_counter() - start
+
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, recall@{K}")
+    print(f"IVF build: {build_time:.1f}s with {ivf.n_lists} lists")
+    print(f"{'search':<14} {'recall':>7} {'latency':>10} {'speedup':>8}")
+    print(f"{'exact':<14} {1.0:>7.3f} {exact_latency * 1000:>7.2f} ms {1.0:>7.1f}x")
+    for n_probe in N_PROBES:
+        found, latency = timed_searches(lambda q: ivf.search(q, K, n_probe), queries)
+        recall = np.mean([len(np.intersect1d(f, t)) / K for f, t in zip(found, truth)])
+        print(f"{'ivf n_probe=' + str(n_probe):<14} {recall:>7.3f} {latency * 1000:>7.2f} ms "
+              f"{exact_latency / latency:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
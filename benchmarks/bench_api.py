@@ -0,0 +1,157 @@
+"""
+Load test of the HTTP API (api_server.py) with Gemini replaced by the in-process fake
+(fake_gemini.py), so runs need no API key and the model's latency is under control.
+The server runs in this process on a free port; each simulated client keeps one
+HTTP connection open and sends requests back to back for the given duration.
+
+Reports throughput, latency percentiles of successful requests and how many were
+refused with 429. Run from the project root:
+    python benchmarks/bench_api.py --clients 32 --duration 20 --latency 0.5
+    python benchmarks/bench_api.py --endpoint novelty --clients 64 --max-concurrent 4
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+import fake_gemini
+import rate_limiter
+import synthetic_pdfs
+from bench_suite import database_folder, summarize
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(app, port):
+    """Runs uvicorn on a background thread and returns it once it accepts connections."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("The API server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+def client(port, path, pdfs, deadline, offset):
+    """Sends requests over one kept-alive connection until deadline; returns (status, seconds) pairs."""
+    results = []
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+    i = offset
+    while time.perf_counter() < deadline:
+        body = pdfs[i % len(pdfs)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, body=body, headers={"Content-Type": "application/pdf"})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+            status = None
+        results.append((status, time.perf_counter() - start))
+        if status == 429:
+            # A real client would honour Retry-After; pausing briefly keeps the refusals countable
+            time.sleep(0.05)
+    conn.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--endpoint", choices=["evaluate", "novelty"], default="evaluate")
+    parser.add_argument("--backend", choices=["gemini", "local"], default="gemini")
+    parser.add_argument("--clients", type=int, default=32, help="Simulated clients sending at the same time")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds each client keeps sending")
+    parser.add_argument("--proposals", type=int, default=20, help="Distinct proposal PDFs the clients cycle through")
+    parser.add_argument("--database-size", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--max-concurrent", type=int, default=None, help="Overrides API_MAX_CONCURRENT")
+    parser.add_argument("--max-waiting", type=int, default=None, help="Overrides API_MAX_WAITING")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ask the fake model every time instead of serving repeats from the response cache")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake Gemini seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--workdir", default=os.path.join(".cache", "bench"),
+                        help="Where synthetic PDFs and caches are kept between runs (shared with bench_suite.py)")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    # Caches and the job database use relative paths, so this keeps them inside the work directory
+    os.chdir(workdir)
+    shutil.rmtree(".cache", ignore_errors=True)
+    fake = fake_gemini.install(args.latency, args.jitter, args.failure_rate)
+    # The fake has no quota; keep the shared limiter from throttling it
+    for model in list(rate_limiter.MODEL_LIMITS):
+        rate_limiter.MODEL_LIMITS[model] = (1_000_000, 1_000_000_000)
+    import api_server
+
+    folder = database_folder(workdir, args.database_size)
+    paths = synthetic_pdfs.generate(os.path.join(workdir, "pdfs", "proposals"), args.proposals, args.pages,
+                                    seed=2, prefix="proposal")
+    pdfs = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pdfs.append(f.read())
+
+    limits = {key: value for key, value in [("max_concurrent", args.max_concurrent),
+                                             ("max_waiting", args.max_waiting)] if value is not None}
+    app = api_server.create_app(folder, "fake", **limits)
+    port = free_port()
+    server, thread = start_server(app, port)
+    if args.endpoint == "evaluate":
+        path = f"/v1/evaluate?backend={args.backend}&use_cache={'false' if args.no_cache else 'true'}"
+    else:
+        path = f"/v1/novelty?backend={args.backend}&k=3"
+
+    # One request first builds the database index, so its cost is not counted against the clients
+    print(f"Warming up on {args.database_size} database documents...")
+    warm_up = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+    warm_up.request("POST", path, body=pdfs[0], headers={"Content-Type": "application/pdf"})
+    warm_up.getresponse().read()
+    warm_up.close()
+    print(f"Running {args.clients} clients for {args.duration:.0f}s...")
+    start = time.perf_counter()
+    deadline = start + args.duration
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        batches = list(pool.map(lambda n: client(port, path, pdfs, deadline, n), range(args.clients)))
+    elapsed = time.perf_counter() - start
+    server.should_exit = True
+    thread.join()
+
+    results = [result for batch in batches for result in batch]
+    ok = [seconds for status, seconds in results if status == 200]
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    report = {
+        "endpoint": args.endpoint,
+        "clients": args.clients,
+        "limits": {"max_concurrent": args.max_concurrent or api_server.MAX_CONCURRENT,
+                   "max_waiting": args.max_waiting or api_server.MAX_WAITING},
+        "requests": len(results),
+        "statuses": statuses,
+        "ok_per_second": len(ok) / elapsed,
+        "rejected_share": statuses.get("429", 0) / max(1, len(results)),
+        "latency_ok": summarize(ok) if ok else None,
+        "fake_gemini": fake.counts,
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cold-start profile of the Streamlit app: the slowest imports in a fresh interpreter,
+and how long the upload page takes to render on the first run and on a rerun.
+Every measurement uses a new Python process, so nothing is already imported.
+
+Run from the project root:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --module pipeline --top 25
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs app.py the way the Streamlit server does, without a browser; streamlit itself
+# is imported before the clock starts because the server has always loaded it already
+_RENDER_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+start = time.perf_counter()
+app.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - start
+print(json.dumps({"first_run_ms": first * 1000, "rerun_ms": rerun * 1000, "exception": bool(app.exception)}))
+"""
+
+def _python(args, cwd=PROJECT_DIR):
+    # Project modules come from PYTHONPATH, so cwd only decides where relative cache paths land
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR, PYTHONWARNINGS="ignore")
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env,
+                          capture_output=True, text=True, check=True)
+
+def import_profile(module, top=15, cwd=PROJECT_DIR):
+    """
+    Imports module in a fresh interpreter with -X importtime, run in cwd.
+    Returns:
+        {"total_ms", "slowest": [(name, cumulative_ms), ...]} for the packages imported
+        directly by module or by the modules it imports from this project.
+    """
+    stderr = _python(["-X", "importtime", "-c", f"import {module}"], cwd).stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        timings.append((name.strip(), depth, int(cumulative) / 1000))
+    # A module's row comes after all of its imports'; its direct imports are the depth-1
+    # rows since the previous top-level row (interpreter start-up comes before that)
+    end = max(i for i, (name, depth, _) in enumerate(timings) if name == module and depth == 0)
+    start = max([i for i, (_, depth, _) in enumerate(timings[:end]) if depth == 0], default=-1) + 1
+    direct = sorted(((name, ms) for name, depth, ms in timings[start:end] if depth == 1), key=lambda row: -row[1])
+    return {"total_ms": timings[end][2], "slowest": direct[:top]}
+
+def render_times(app_path=os.path.join(PROJECT_DIR, "app.py"), repeats=3, cwd=PROJECT_DIR):
+    """Median first-run and rerun time of the upload page over repeats fresh processes run in cwd."""
+    runs = [json.loads(_python(["-c", _RENDER_SCRIPT, app_path], cwd).stdout.strip().splitlines()[-1])
+            for _ in range(repeats)]
+    if any(run["exception"] for run in runs):
+        raise RuntimeError("app.py raised an exception while rendering")
+    return {key: statistics.median(run[key] for run in runs) for key in ["first_run_ms", "rerun_ms"]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app", help="Module whose imports are profiled")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh processes per render measurement")
+    args = parser.parse_args()
+
+    profile = import_profile(args.module, args.top)
+    print(f"import {args.module}: {profile['total_ms']:.0f} ms")
+    for name, ms in profile["slowest"]:
+        print(f"  {name:<40} {ms:>8.1f} ms")
+    times = render_times(repeats=args.repeats)
+    print(f"upload page first run: {times['first_run_ms']:.0f} ms, rerun: {times['rerun_ms']:.0f} ms")
+
+if __name__ == "__main__":
+    main()
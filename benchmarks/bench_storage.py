@@ -0,0 +1,151 @@
+"""
+Memory, latency and recall of the embedding index for each storage type, on synthetic
+clustered vectors (see bench_ann.py). Every configuration is measured in a fresh process
+that memory-maps the saved index, as each Streamlit worker does. "float32-ram" reads the
+whole matrix into the process instead, as the index did before it was memory-mapped.
+
+Memory is reported from /proc/self/status (Linux only):
+- private: anonymous memory of the process; every replica pays it in full.
+- mapped: pages of the index files the process read; shared by all replicas through
+  the page cache. The files are evicted from the page cache before each run, so this
+  counts only the pages a configuration really needs.
+
+Run from the project root:
+    python benchmarks/bench_storage.py --documents 25000 --chunks 4
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+from bench_ann import synthetic_embeddings
+from embedding_index import RERANK_DOCUMENTS, EmbeddingIndex
+from vector_ops import normalize_rows
+
+K = 10
+MODEL = "bench-storage"
+CONFIGURATIONS = ["float32-ram", "float32", "float16", "int8"]
+
+def memory_mb():
+    """Private and file-backed resident memory of this process, in MB, or None off Linux."""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f)
+    except OSError:
+        return None
+    return {"private": int(fields["RssAnon"].split()[0]) / 1024, "mapped": int(fields["RssFile"].split()[0]) / 1024}
+
+def evict(index_dir):
+    """Drops the index files from the OS page cache, where the platform allows it."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for name in os.listdir(index_dir):
+        fd = os.open(os.path.join(index_dir, name), os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+def build(index_dir, documents, chunks, dim, topics, queries):
+    """Saves a synthetic float32 index and queries; returns the exact top-K documents of each query."""
+    rng = np.random.default_rng(0)
+    matrix = synthetic_embeddings(documents * chunks, dim, topics, rng)
+    index = EmbeddingIndex(index_dir, MODEL, dim, storage="float32")
+    entries = [{"filename": f"doc_{i:06d}.pdf", "chunks": chunks} for i in range(documents)]
+    # Bypasses sync, which would need a folder of PDFs and an embedding backend
+    index._set(entries, matrix)
+    index.save()
+    picks = rng.choice(len(matrix), queries, replace=False)
+    query_vectors = normalize_rows(matrix[picks] + rng.standard_normal((queries, dim)).astype(np.float32) * 0.02)
+    np.save(os.path.join(index_dir, "queries.npy"), query_vectors)
+    return [index.search(query, K, exact=True)[0].tolist() for query in query_vectors]
+
+def measure(index_dir, configuration, mode, rerank):
+    """Runs in a fresh process: loads the index, searches every query, reports timings and memory."""
+    query_vectors = np.load(os.path.join(index_dir, "queries.npy"))
+    storage = "float32" if configuration == "float32-ram" else configuration
+    before = memory_mb()
+    start = time.perf_counter()
+    index = EmbeddingIndex(index_dir, MODEL, query_vectors.shape[1], storage=storage).load()
+    if configuration == "float32-ram":
+        index._set(index.entries, np.array(index.embeddings))
+    load_seconds = time.perf_counter() - start
+    # "scan" always scores every chunk; "ivf" always goes through the approximate index
+    threshold = 0 if mode == "ivf" else len(index.embeddings) + 1
+    start = time.perf_counter()
+    index.prepare_search(threshold)
+    build_seconds = time.perf_counter() - start
+    results, latencies = [], []
+    for query in query_vectors:
+        start = time.perf_counter()
+        indices, _, _ = index.search(query, K, ann_threshold=threshold, rerank=int(rerank))
+        latencies.append(time.perf_counter() - start)
+        results.append(indices.tolist())
+    after = memory_mb()
+    memory = {key: after[key] - before[key] for key in after} if after else None
+    return {"load_seconds": load_seconds, "build_seconds": build_seconds, "memory_mb": memory,
+            "latency_ms": {"mean": float(np.mean(latencies)) * 1000, "p50": float(np.median(latencies)) * 1000},
+            "results": results}
+
+def index_files_mb(index_dir, storage):
+    """Disk size of the float32 vectors plus, for quantized storage, their quantized copy."""
+    total = 0
+    for name in os.listdir(index_dir):
+        parts = name.split(".")
+        if name.startswith("embeddings") and name.endswith(".npy") and (len(parts) == 2 or storage in parts[1]):
+            total += os.path.getsize(os.path.join(index_dir, name))
+    return total / 2 ** 20
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=25_000)
+    parser.add_argument("--chunks", type=int, default=4, help="Chunks per document")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--modes", nargs="+", default=["scan", "ivf"], choices=["scan", "ivf"])
+    parser.add_argument("--rerank", type=int, default=RERANK_DOCUMENTS,
+                        help="Documents re-scored in float32 after a quantized scan")
+    parser.add_argument("--workdir", default=os.path.join(".cache", "bench_storage"))
+    parser.add_argument("--measure", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    index_dir = os.path.abspath(args.workdir)
+    shutil.rmtree(index_dir, ignore_errors=True)
+    print(f"Building {args.documents} documents x {args.chunks} chunks x {args.dim} dims...")
+    truth = build(index_dir, args.documents, args.chunks, args.dim, args.topics, args.queries)
+    for storage in ["float16", "int8"]:
+        # Writes the quantized copy once, so the measured processes only map it
+        start = time.perf_counter()
+        EmbeddingIndex(index_dir, MODEL, args.dim, storage=storage).load()
+        print(f"{storage} copy written in {time.perf_counter() - start:.1f}s")
+
+    print(f"\n{'storage':<12} {'mode':<5} {'disk MB':>8} {'private MB':>11} {'mapped MB':>10} "
+          f"{'load ms':>8} {'build s':>8} {'p50 ms':>8} {'recall@' + str(K):>10}")
+    for mode in args.modes:
+        for configuration in CONFIGURATIONS:
+            evict(index_dir)
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", index_dir,
+                                     configuration, mode, str(args.rerank)], capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            recall = np.mean([len(set(found) & set(expected)) / K
+                              for found, expected in zip(result["results"], truth)])
+            memory = result["memory_mb"] or {"private": float("nan"), "mapped": float("nan")}
+            storage = "float32" if configuration == "float32-ram" else configuration
+            print(f"{configuration:<12} {mode:<5} {index_files_mb(index_dir, storage):>8.0f} "
+                  f"{memory['private']:>11.0f} {memory['mapped']:>10.0f} {result['load_seconds'] * 1000:>8.1f} "
+                  f"{result['build_seconds']:>8.1f} {result['latency_ms']['p50']:>8.2f} {recall:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Benchmark suite for the evaluation pipeline, with Gemini replaced by an in-process
+fake of configurable latency and failure rate (see fake_gemini.py), so runs need no
+API key and are repeatable.
+
+- extraction: PDF text extraction throughput, cold and from the text cache.
+- novelty: index build time and search latency against database size.
+- e2e: per-proposal latency of the full pipeline, as batch_evaluate runs it.
+- startup: import time of app.py and render time of its upload page, cold and on rerun.
+
+Synthetic proposal PDFs are generated once into the work directory and reused.
+Caches live there too, so the project's own caches are never touched.
+
+Run from the project root:
+    python benchmarks/bench_suite.py run --output before.json
+    python benchmarks/bench_suite.py run --output after.json
+    python benchmarks/bench_suite.py compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, BENCH_DIR)
+import bench_startup
+import fake_gemini
+import rate_limiter
+import synthetic_pdfs
+from batch_evaluate import evaluate_file
+from embedding_backends import GeminiBackend
+from embedding_index import default_index_dir
+from novelty_checker import check_novelty, load_index
+from pdf_reader import read_pdf_cached, read_pdfs
+
+SUITES = ["extraction", "novelty", "e2e", "startup"]
+# Database documents are kept short so large databases stay quick to generate
+DATABASE_PAGES = 2
+# Each in-memory search is repeated and averaged; a single one takes well under a millisecond
+SEARCH_REPEATS = 20
+# Changes smaller than this relative amount, or than NOISE_FLOOR_MS, are treated as noise by compare
+DEFAULT_THRESHOLD = 0.10
+NOISE_FLOOR_MS = 0.1
+
+def summarize(samples):
+    """Mean, median, 95th percentile and max of a list of seconds, in milliseconds."""
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return {
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": statistics.median(samples) * 1000,
+        "p95_ms": p95 * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+def bench_extraction(args, workdir):
+    paths = synthetic_pdfs.generate(os.path.join(workdir, "pdfs", "extraction"), args.docs, args.pages)
+    texts, cold = timed(lambda: read_pdfs(paths, use_cache=False))
+    chars = sum(len(text) for text in texts.values())
+    read_pdfs(paths)
+    _, cached = timed(lambda: read_pdfs(paths))
+    return {
+        "documents": len(paths),
+        "cold_seconds": cold,
+        "cold_docs_per_second": len(paths) / cold,
+        "cold_chars_per_second": chars / cold,
+        "cached_seconds": cached,
+        "cached_docs_per_second": len(paths) / cached,
+    }
+
+def database_folder(workdir, size):
+    """A folder of the first size synthetic database PDFs, hard-linked from one shared pool."""
+    pool = synthetic_pdfs.generate(os.path.join(workdir, "pdfs", "pool"), size, DATABASE_PAGES, prefix="db")
+    folder = os.path.join(workdir, "databases", f"db_{size}")
+    os.makedirs(folder, exist_ok=True)
+    for path in pool:
+        target = os.path.join(folder, os.path.basename(path))
+        if not os.path.exists(target):
+            try:
+                os.link(path, target)
+            except OSError:
+                with open(path, "rb") as src, open(target, "wb") as dst:
+                    dst.write(src.read())
+    return folder
+
+def query_texts(args, workdir):
+    paths = synthetic_pdfs.generate(os.path.join(workdir, "pdfs", "queries"), args.queries, args.pages,
+                                    seed=1, prefix="query")
+    texts = []
+    for path in paths:
+        with open(path, "rb") as f:
+            texts.append(read_pdf_cached(f.read()))
+    return texts
+
+def bench_novelty(args, workdir):
+    backend = GeminiBackend("fake")
+    queries = query_texts(args, workdir)
+    query_vectors = [np.array(backend.embed([text])) for text in queries]
+    results = {}
+    for size in args.db_sizes:
+        folder = database_folder(workdir, size)
+        shutil.rmtree(default_index_dir(folder), ignore_errors=True)
+        index, build = timed(lambda: load_index(folder, "fake", backend=backend))
+        _, reload = timed(lambda: load_index(folder, "fake", backend=backend))
+        search = [timed(lambda: [index.search(vectors, 3) for _ in range(SEARCH_REPEATS)])[1] / SEARCH_REPEATS
+                  for vectors in query_vectors]
+        full = [timed(lambda: check_novelty(text, folder, "fake", index=index, backend=backend))[1]
+                for text in queries]
+        results[f"db_{size}"] = {
+            "documents": len(index),
+            "chunks": int(len(index.embeddings)),
+            "build_seconds": build,
+            "reload_seconds": reload,
+            "search": summarize(search),
+            "check_novelty": summarize(full),
+        }
+    return results
+
+def bench_e2e(args, workdir):
+    folder = database_folder(workdir, max(args.db_sizes))
+    index = load_index(folder, "fake")
+    paths = synthetic_pdfs.generate(os.path.join(workdir, "pdfs", "proposals"), args.proposals, args.pages,
+                                    seed=2, prefix="proposal")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        records = list(pool.map(lambda path: evaluate_file(path, folder, "fake", index, False), paths))
+    elapsed = time.perf_counter() - start
+    results = {
+        "proposals": len(records),
+        "failed": sum(1 for record in records if record["status"] != "ok"),
+        "proposals_per_second": len(records) / elapsed,
+    }
+    for stage in ["read", "novelty", "evaluation", "total"]:
+        samples = [record["timings"][stage] for record in records if stage in record["timings"]]
+        if samples:
+            results[stage] = summarize(samples)
+    return results
+
+def bench_startup_times(args, workdir):
+    # Run in the work directory, so anything app.py creates on import stays out of the project
+    profile = bench_startup.import_profile("app", cwd=workdir)
+    return dict(bench_startup.render_times(cwd=workdir), import_app_ms=profile["total_ms"])
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    workdir = os.path.abspath(args.workdir)
+    output = os.path.abspath(args.output)
+    os.makedirs(workdir, exist_ok=True)
+    # Text and response caches use relative paths, so this keeps them inside the work directory.
+    # They are cleared so every run starts cold; only the generated PDFs are reused.
+    os.chdir(workdir)
+    shutil.rmtree(".cache", ignore_errors=True)
+    fake = fake_gemini.install(args.latency, args.jitter, args.failure_rate, args.seed)
+    # The fake has no quota; keep the shared limiter from throttling it
+    for model in list(rate_limiter.MODEL_LIMITS):
+        rate_limiter.MODEL_LIMITS[model] = (1_000_000, 1_000_000_000)
+
+    suites = {"extraction": bench_extraction, "novelty": bench_novelty, "e2e": bench_e2e,
+              "startup": bench_startup_times}
+    results = {}
+    for name in args.only or SUITES:
+        print(f"Running {name}...")
+        results[name] = suites[name](args, workdir)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key != "func"},
+            "fake_gemini": fake.counts,
+        },
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+    return 0
+
+def flatten(results, prefix=""):
+    metrics = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            metrics[f"{prefix}{key}"] = value
+    return metrics
+
+def higher_is_better(metric):
+    return metric.endswith("_per_second")
+
+def compare(args):
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, "r", encoding="utf-8") as f:
+        candidate = json.load(f)
+    old, new = flatten(baseline["results"]), flatten(candidate["results"])
+    print(f"baseline {baseline['meta'].get('commit')}  vs  candidate {candidate['meta'].get('commit')}")
+    print(f"{'metric':<44} {'baseline':>12} {'candidate':>12} {'change':>8}")
+    regressions = 0
+    for metric in sorted(old.keys() & new.keys()):
+        if not metric.endswith(("_ms", "_seconds", "_per_second")):
+            continue
+        before, after = old[metric], new[metric]
+        change = (after - before) / before if before else 0.0
+        worse = -change if higher_is_better(metric) else change
+        if metric.endswith("_ms") and abs(after - before) < NOISE_FLOOR_MS:
+            worse = 0.0
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = "  faster"
+        print(f"{metric:<44} {before:>12.3f} {after:>12.3f} {change:>+7.1%}{flag}")
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite for the R&D proposal evaluator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write a JSON report")
+    run_parser.add_argument("--output", default="bench_results.json")
+    run_parser.add_argument("--workdir", default=os.path.join(".cache", "bench"),
+                            help="Where synthetic PDFs and caches are kept between runs")
+    run_parser.add_argument("--only", nargs="+", choices=SUITES)
+    run_parser.add_argument("--docs", type=int, default=40, help="PDFs in the extraction benchmark")
+    run_parser.add_argument("--pages", type=int, default=3, help="Pages per extraction, query and proposal PDF")
+    run_parser.add_argument("--db-sizes", type=lambda text: [int(n) for n in text.split(",")],
+                            default=[10, 50, 200], help="Comma-separated database sizes for the novelty benchmark")
+    run_parser.add_argument("--queries", type=int, default=10)
+    run_parser.add_argument("--proposals", type=int, default=10, help="Proposals in the end-to-end benchmark")
+    run_parser.add_argument("--workers", type=int, default=4, help="Proposals evaluated at the same time")
+    run_parser.add_argument("--latency", type=float, default=0.2, help="Fake Gemini seconds per request")
+    run_parser.add_argument("--jitter", type=float, default=0.05)
+    run_parser.add_argument("--failure-rate", type=float, default=0.0,
+                            help="Probability that a fake request fails with a retryable 503")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two JSON reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="Relative change treated as a real difference")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark: per-pair cosine loop + full sort (the old check_novelty path)
+versus one matrix-vector product + argpartition over a pre-normalized matrix.
+
+Run from the project root:
+    python benchmarks/bench_topk.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vector_ops import normalize_rows, top_k
+from novelty_checker import calculate_similarity
+
+DIM = 768
+K = 3
+SIZES = [1_000, 10_000, 100_000]
+
+def loop_search(vectors, filenames, query, k):
+    similarities = [(calculate_similarity(query, vec), name) for vec, name in zip(vectors, filenames)]
+    similarities.sort(key=lambda x: x[0], reverse=True)
+    return similarities[:k]
+
+def best_of(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'vectors':>8} | {'loop + sort':>12} | {'matvec + top-k':>14} | {'speedup':>7}")
+    print("-" * 52)
+    for n in SIZES:
+        vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+        filenames = [f"doc_{i}.pdf" for i in range(n)]
+        query = rng.standard_normal(DIM).astype(np.float32)
+        matrix = normalize_rows(vectors)
+        unit_query = normalize_rows(query)
+
+        # Both paths must agree on the winners before timing means anything
+        expected = [name for _, name in loop_search(vectors, filenames, query, K)]
+        indices, _ = top_k(matrix, unit_query, K)
+        assert [filenames[i] for i in indices] == expected
+
+        loop_time = best_of(lambda: loop_search(vectors, filenames, query, K), 1 if n >= 100_000 else 3)
+        fast_time = best_of(lambda: top_k(matrix, unit_query, K), 20)
+        print(f"{n:>8} | {loop_time * 1000:>9.1f} ms | {fast_time * 1000:>11.3f} ms | {loop_time / fast_time:>6.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+In-process stand-in for the Gemini SDK, so benchmarks measure this project's code
+rather than the network. install() patches google.generativeai in place:
+
+- embed_content returns deterministic 768-dimensional vectors seeded by the text,
+  so identical texts always get identical embeddings.
+- GenerativeModel.generate_content returns a fixed, schema-valid evaluation, in
+  pieces when stream=True.
+- Every request sleeps for latency (+/- jitter) seconds and fails with a retryable
+  503 error with probability failure_rate, exercising the retry path.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+import numpy as np
+import google.generativeai as genai
+
+DIMENSION = 768
+
+EVALUATION = json.dumps({
+    "clarity_score": {"score": 7, "justification": "The objectives and work plan are clearly stated."},
+    "novelty_score": {"score": 6, "justification": "Builds on known methods with a new application."},
+    "feasibility_score": {"score": 8, "justification": "Budget and timeline are realistic."},
+    "strengths": "Clear methodology and a well defined scope.",
+    "weaknesses": "Limited discussion of risks and alternatives.",
+})
+
+class ServiceUnavailable(Exception):
+    """Named and coded like the SDK's 503 error so rate_limiter treats it as retryable."""
+    code = 503
+
+class FakeGemini:
+    """
+    Args:
+        latency: Mean seconds per request.
+        jitter: Latency varies uniformly by up to this many seconds either way.
+        failure_rate: Probability in [0, 1] that a request fails with ServiceUnavailable.
+        seed: Seed for the latency and failure draws.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"embed_requests": 0, "embedded_texts": 0, "generate_requests": 0, "failures": 0}
+
+    def _request(self, kind, texts=0):
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.failure_rate
+            self.counts[kind] += 1
+            self.counts["embedded_texts"] += texts
+            self.counts["failures"] += fail
+        time.sleep(delay)
+        if fail:
+            raise ServiceUnavailable("503 The service is currently unavailable (injected by fake_gemini)")
+
+    def embed_content(self, model, content, task_type=None, **kwargs):
+        texts = [content] if isinstance(content, str) else list(content)
+        self._request("embed_requests", len(texts))
+        vectors = [embedding_for(text) for text in texts]
+        return {"embedding": vectors[0] if isinstance(content, str) else vectors}
+
+    def model_class(self):
+        fake = self
+
+        class FakeModel:
+            def __init__(self, model_name, **kwargs):
+                self.model_name = model_name
+
+            def generate_content(self, prompt, stream=False, **kwargs):
+                fake._request("generate_requests")
+                if not stream:
+                    return _Response(EVALUATION)
+                return (_Response(EVALUATION[i:i + 64]) for i in range(0, len(EVALUATION), 64))
+
+        return FakeModel
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+def embedding_for(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(DIMENSION).astype(np.float32).tolist()
+
+def install(latency=0.0, jitter=0.0, failure_rate=0.0, seed=0):
+    """Patches google.generativeai with a FakeGemini and returns it."""
+    fake = FakeGemini(latency, jitter, failure_rate, seed)
+    genai.configure = lambda **kwargs: None
+    genai.embed_content = fake.embed_content
+    genai.GenerativeModel = fake.model_class()
+    return fake
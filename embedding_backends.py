@@ -0,0 +1,192 @@
+import re
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import metrics
+from rate_limiter import call_with_retry, estimate_tokens
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+# text-embedding-004 returns 768-dimensional vectors
+GEMINI_DIMENSION = 768
+
+# Bump when the local feature extraction changes, so old vectors are rebuilt
+HASHING_VERSION = 1
+HASHING_DIMENSION = 1024
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+# batchEmbedContents accepts at most 100 texts per request
+EMBEDDING_BATCH_SIZE = 100
+# Rough per-request token budget; a batch is closed early once its texts would exceed it
+EMBEDDING_BATCH_TOKENS = 100_000
+# The model only reads the first 2048 tokens of each text
+EMBEDDING_MAX_TOKENS_PER_TEXT = 2048
+EMBEDDING_WORKERS = 4
+
+_configure_lock = threading.Lock()
+_configured_key = None
+
+def _configure(api_key):
+    """Configures the SDK once per key instead of on every request."""
+    global _configured_key
+    with _configure_lock:
+        if api_key != _configured_key:
+            # The SDK takes about half a second to import, so it is loaded on first use
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            _configured_key = api_key
+
+def _estimate_tokens(text):
+    return min(estimate_tokens(text), EMBEDDING_MAX_TOKENS_PER_TEXT)
+
+def get_embedding(text, api_key, model=EMBEDDING_MODEL):
+    try:
+        _configure(api_key)
+        import google.generativeai as genai
+        tokens = _estimate_tokens(text)
+        with metrics.span("embedding_request", model=model, texts=1, tokens=tokens):
+            # IMPORTANT: Make sure this model name is correct for your API key
+            result = call_with_retry(model, lambda: genai.embed_content(
+                model=model,
+                content=text,
+                task_type="RETRIEVAL_DOCUMENT"
+            ), tokens=tokens)
+        return result['embedding']
+    except Exception as e:
+        print(f"Error creating embedding: {e}")
+        return None
+
+def make_batches(texts, batch_size=EMBEDDING_BATCH_SIZE, max_batch_tokens=EMBEDDING_BATCH_TOKENS):
+    """
+    Groups text positions into batches that respect both the item and token limits.
+    Returns:
+        A list of lists of indices into texts.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = _estimate_tokens(text)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _embed_batch(texts, api_key, model=EMBEDDING_MODEL):
+    import google.generativeai as genai
+    tokens = sum(_estimate_tokens(text) for text in texts)
+    try:
+        with metrics.span("embedding_request", model=model, texts=len(texts), tokens=tokens):
+            result = call_with_retry(model, lambda: genai.embed_content(
+                model=model,
+                content=texts,
+                task_type="RETRIEVAL_DOCUMENT"
+            ), tokens=tokens)
+        return result['embedding']
+    except Exception as e:
+        # Retry one by one so a single bad document cannot sink its neighbours
+        print(f"Error creating batch embedding, retrying {len(texts)} items individually: {e}")
+        return [get_embedding(text, api_key, model) for text in texts]
+
+def get_embeddings(texts, api_key, batch_size=EMBEDDING_BATCH_SIZE,
+                   max_batch_tokens=EMBEDDING_BATCH_TOKENS, max_workers=EMBEDDING_WORKERS, model=EMBEDDING_MODEL):
+    """
+    Embeds many documents with batched requests, several batches in flight at once.
+    Args:
+        texts: List of document texts.
+        api_key: Google API key.
+        batch_size: Maximum texts per request.
+        max_batch_tokens: Approximate maximum tokens per request.
+        max_workers: Maximum concurrent requests.
+        model: Embedding model name.
+    Returns:
+        A list of embeddings in the same order as texts, with None for items that failed.
+    """
+    if not texts:
+        return []
+    _configure(api_key)
+    embeddings = [None] * len(texts)
+    batches = make_batches(texts, batch_size, max_batch_tokens)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(metrics.propagate(lambda batch: _embed_batch([texts[i] for i in batch], api_key, model)), batches)
+        for batch, batch_embeddings in zip(batches, results):
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+    return embeddings
+
+class GeminiBackend:
+    """
+    Embeds texts remotely with a Gemini embedding model, batched and rate limited.
+    Args:
+        api_key: Google API key.
+        model: Embedding model name.
+        dimension: Length of the vectors the model returns.
+    """
+
+    def __init__(self, api_key, model=EMBEDDING_MODEL, dimension=GEMINI_DIMENSION):
+        self.api_key = api_key
+        self.model = model
+        self.dimension = dimension
+
+    @property
+    def name(self):
+        return f"gemini:{self.model}"
+
+    def embed(self, texts):
+        """Returns one vector per text, in order, with None for any text that failed."""
+        return get_embeddings(texts, self.api_key, model=self.model)
+
+class HashingBackend:
+    """
+    Local, network-free embeddings: a signed feature-hashing projection of word unigrams
+    and bigrams with sublinear term frequency, so shared vocabulary gives a high cosine.
+    Vectors depend only on the text, never on the rest of the archive, so stored vectors
+    stay valid as the database grows.
+    Args:
+        dimension: Number of hash buckets.
+    """
+
+    def __init__(self, dimension=HASHING_DIMENSION):
+        self.dimension = dimension
+
+    @property
+    def name(self):
+        return f"hashing:v{HASHING_VERSION}"
+
+    def _features(self, text):
+        words = [word for word in _WORD_RE.findall(text.lower()) if word not in _STOP_WORDS]
+        return Counter(words + [" ".join(pair) for pair in zip(words, words[1:])])
+
+    def embed_one(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            digest = zlib.crc32(feature.encode("utf-8"))
+            # The top bit picks the sign so colliding features tend to cancel rather than add up
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dimension] += sign * (1.0 + np.log(count))
+        return vector
+
+    def embed(self, texts):
+        """Returns one vector per text, in order."""
+        with metrics.span("embedding_request", model=self.name, texts=len(texts)):
+            return [self.embed_one(text) for text in texts]
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "local": lambda api_key=None: HashingBackend(),
+}
+
+def get_backend(name, api_key=None):
+    """
+    Returns the embedding backend registered under name ("gemini" or "local").
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    return BACKENDS[name](api_key)
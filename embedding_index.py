@@ -0,0 +1,477 @@
+import json
+import mmap
+import os
+import threading
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+import numpy as np
+from ann_index import ANN_THRESHOLD, ExactSearcher, build_searcher
+from pdf_reader import read_pdfs
+from quantization import STORAGE_TYPES, max_scores, quantize
+from text_cache import file_sha256
+from vector_ops import normalize_rows, select_top_k
+
+INDEX_DIRNAME = ".index"
+INDEX_VERSION = 4
+
+# ~1000 tokens per chunk keeps every request well inside the embedding model's input limit
+CHUNK_CHARS = 4000
+CHUNK_OVERLAP = 400
+# Chunk rows fetched from the ANN index per query chunk before exact re-scoring
+ANN_CANDIDATES = 100
+# Copy of the vectors scanned by exhaustive searches: float32, or float16/int8 to cut memory
+DEFAULT_STORAGE = os.environ.get("EMBEDDING_STORAGE", "float32")
+# Documents re-scored with the float32 vectors after a scan of a quantized copy
+RERANK_DOCUMENTS = 50
+# Vector file of indexes written before files were versioned
+LEGACY_VECTORS_FILE = "embeddings.npy"
+# Held while a process syncs, so processes sharing an index never embed the same files twice
+SYNC_LOCK_FILE = "sync.lock"
+
+try:
+    import fcntl
+except ImportError:  # Windows: syncs are only serialized within a process
+    fcntl = None
+
+# Filenames added, modified and removed by a sync, and whether the index was rewritten
+SyncResult = namedtuple("SyncResult", ["added", "modified", "removed", "changed"])
+
+def default_index_dir(database_folder):
+    return os.path.join(database_folder, INDEX_DIRNAME)
+
+def chunk_text(text, chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """
+    Splits text into overlapping windows of at most chunk_chars characters,
+    preferring to break on whitespace near the end of each window.
+    """
+    text = text.strip()
+    if len(text) <= chunk_chars:
+        return [text] if text else []
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            floor = start + chunk_chars * 4 // 5
+            cut = max(text.rfind(" ", floor, end), text.rfind("\n", floor, end))
+            if cut > start:
+                end = cut
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+def aggregate_chunk_scores(chunk_scores, offsets, method="max", top_chunks=3):
+    """
+    Reduces per-chunk scores to one score per document.
+    Args:
+        chunk_scores: Score of every stored chunk, grouped contiguously by document.
+        offsets: Index of each document's first chunk, ascending. Every document has at least one chunk.
+        method: "max" for the best chunk, or "mean_top_k" for the mean of the best top_chunks chunks.
+        top_chunks: Number of chunks averaged by "mean_top_k".
+    """
+    if method == "max":
+        return np.maximum.reduceat(chunk_scores, offsets)
+    if method != "mean_top_k":
+        raise ValueError(f"Unknown aggregation method: {method}")
+    counts = np.diff(np.append(offsets, len(chunk_scores)))
+    doc_ids = np.repeat(np.arange(len(offsets)), counts)
+    # Sort by document, then by descending score, and keep each document's first top_chunks rows
+    order = np.lexsort((-chunk_scores, doc_ids))
+    rank = np.arange(len(order)) - offsets[doc_ids[order]]
+    keep = order[rank < top_chunks]
+    sums = np.bincount(doc_ids[keep], weights=chunk_scores[keep], minlength=len(offsets))
+    return sums / np.minimum(counts, top_chunks)
+
+class EmbeddingIndex:
+    """
+    Persistent store of database embeddings, keyed by the SHA-256 of each PDF.
+    Files whose bytes have not changed are never read or embedded again.
+    Each document is stored as overlapping chunks; chunk vectors are kept
+    unit-normalized in a single matrix, grouped contiguously by document.
+    meta.json doubles as the manifest of the database folder: it records the
+    size, mtime and hash of every PDF, including ones that could not be read.
+    Vectors are memory-mapped from .npy files rather than read into each process,
+    so every process serving the same index shares one copy in the OS page cache.
+    Args:
+        index_dir: Folder holding meta.json and the vector files it names.
+        model: Name of the embedding backend; an index built with another backend is discarded.
+        dimension: Length of the backend's vectors; vectors of any other length are rejected.
+        storage: "float16" or "int8" to score chunks from a quantized copy of the vectors and
+            re-score only the best documents in float32; "float32" scores the vectors as is.
+    """
+
+    def __init__(self, index_dir, model, dimension=None, storage=DEFAULT_STORAGE):
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage type {storage!r}; expected one of {', '.join(STORAGE_TYPES)}")
+        self.index_dir = index_dir
+        self.model = model
+        self.dimension = dimension
+        self.storage = storage
+        self.skipped = {}
+        self._vectors_file = None
+        self._meta_stamp = None
+        self._sync_lock = threading.Lock()
+        self._searcher_lock = threading.Lock()
+        self._searcher = None
+        self._set([], np.empty((0, 0), dtype=np.float32))
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.index_dir, "meta.json")
+
+    def _path(self, filename):
+        return os.path.join(self.index_dir, filename)
+
+    def _quantized_files(self, vectors_file):
+        stem = vectors_file[:-len(".npy")]
+        return f"{stem}.{self.storage}.npy", f"{stem}.{self.storage}-scale.npy"
+
+    @property
+    def entries(self):
+        return self._data[0]
+
+    @property
+    def embeddings(self):
+        return self._data[1]
+
+    @property
+    def offsets(self):
+        return self._data[2]
+
+    @property
+    def doc_ids(self):
+        return self._data[3]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _settings(self):
+        return {
+            "version": INDEX_VERSION,
+            "model": self.model,
+            "dimension": self.dimension,
+            "chunk_chars": CHUNK_CHARS,
+            "chunk_overlap": CHUNK_OVERLAP,
+        }
+
+    def _set(self, entries, embeddings, codes=None, scale=None):
+        counts = np.array([entry["chunks"] for entry in entries], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(counts) else counts
+        doc_ids = np.repeat(np.arange(len(counts)), counts)
+        # Swapped in one assignment so a concurrent search never sees a half-updated index
+        self._data = (entries, embeddings, offsets, doc_ids, codes, scale)
+
+    def load(self):
+        if not os.path.exists(self.meta_path):
+            return self
+        try:
+            self._meta_stamp = _stamp(self.meta_path)
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            vectors_file = meta.get("vectors", LEGACY_VECTORS_FILE)
+            embeddings = np.load(self._path(vectors_file), mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable embedding index: {e}")
+            return self
+        if any(meta.get(key) != value for key, value in self._settings().items()):
+            return self
+        if sum(entry["chunks"] for entry in meta["entries"]) != len(embeddings):
+            print("Ignoring embedding index: metadata and vectors are out of step")
+            return self
+        self.skipped = meta.get("skipped", {})
+        self._vectors_file = vectors_file
+        self._set(meta["entries"], embeddings, *self._load_quantized(vectors_file, embeddings))
+        return self
+
+    def _load_quantized(self, vectors_file, embeddings):
+        """Maps the quantized copy of vectors_file, writing it first if this storage type has none yet."""
+        if self.storage == "float32":
+            return None, None
+        # Only re-scored rows are read from now on, so read-ahead would just fill memory
+        _advise_random(embeddings)
+        try:
+            return self._open_quantized(vectors_file)
+        except (OSError, ValueError):
+            pass
+        codes, scale = quantize(embeddings, self.storage)
+        try:
+            self._write_quantized(vectors_file, codes, scale)
+            return self._open_quantized(vectors_file)
+        except OSError as e:
+            print(f"Keeping the {self.storage} vectors in memory: {e}")
+            return codes, scale
+
+    def _open_quantized(self, vectors_file):
+        codes_file, scale_file = self._quantized_files(vectors_file)
+        scale = np.load(self._path(scale_file))
+        # float16 needs no scale; its scale file is empty and only marks the codes as complete
+        return np.load(self._path(codes_file), mmap_mode="r"), scale if len(scale) else None
+
+    def _write_quantized(self, vectors_file, codes, scale):
+        codes_file, scale_file = self._quantized_files(vectors_file)
+        # Written under temporary names and renamed, as another process may have the codes mapped.
+        # The codes file is only trusted once the scale file next to it exists.
+        tmp = f".{uuid.uuid4().hex[:8]}.tmp.npy"
+        np.save(self._path(codes_file) + tmp, codes)
+        os.replace(self._path(codes_file) + tmp, self._path(codes_file))
+        np.save(self._path(scale_file) + tmp, np.empty(0, dtype=np.float32) if scale is None else scale)
+        os.replace(self._path(scale_file) + tmp, self._path(scale_file))
+
+    def save(self):
+        """
+        Writes the vectors to a new file and then points meta.json at it, so a crash never
+        leaves a torn index and processes that still map the old file are unaffected.
+        The saved files are then memory-mapped in place of the in-memory vectors.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        previous_file = self._vectors_file
+        vectors_file = f"embeddings-{uuid.uuid4().hex[:12]}.npy"
+        meta = dict(self._settings(), vectors=vectors_file, entries=self.entries, skipped=self.skipped)
+        np.save(self._path(vectors_file), self.embeddings)
+        if self.storage != "float32":
+            self._write_quantized(vectors_file, *quantize(self.embeddings, self.storage))
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp_meta, self.meta_path)
+        self._meta_stamp = _stamp(self.meta_path)
+        self._vectors_file = vectors_file
+        embeddings = np.load(self._path(vectors_file), mmap_mode="r")
+        self._set(self.entries, embeddings, *self._load_quantized(vectors_file, embeddings))
+        # The previous generation is kept so a process that read the old meta.json can still open it
+        self._remove_stale({vectors_file, previous_file})
+
+    def _remove_stale(self, keep):
+        stems = {name[:-len(".npy")] for name in keep if name}
+        for name in os.listdir(self.index_dir):
+            if name.startswith("embeddings") and name.endswith(".npy") and name.split(".")[0] not in stems:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    # Still mapped by another process on Windows; removed on a later save
+                    pass
+
+    def document_vectors(self, position):
+        """Returns the chunk vectors of the entry at position."""
+        start = self.offsets[position]
+        return self.embeddings[start:start + self.entries[position]["chunks"]]
+
+    def sync(self, database_folder, embed_texts):
+        """
+        Brings the index in line with the PDFs currently in database_folder.
+        Files whose size and mtime match the manifest are trusted without being read;
+        only added or modified files are extracted and embedded, and deleted ones are evicted.
+        Args:
+            database_folder: Folder of past proposals.
+            embed_texts: Callable taking a list of texts and returning a list of vectors
+                in the same order, with None for any text that failed.
+        Returns:
+            A SyncResult listing what changed.
+        """
+        with self._sync_lock, _file_lock(self._path(SYNC_LOCK_FILE)):
+            # Another process may have saved since; start from its index rather than redo its work
+            if _stamp(self.meta_path) != self._meta_stamp:
+                self.load()
+            return self._sync(database_folder, embed_texts)
+
+    def _sync(self, database_folder, embed_texts):
+        old_entries = self.entries
+        positions_by_name = {entry["filename"]: i for i, entry in enumerate(old_entries)}
+        positions_by_hash = {entry["sha256"]: i for i, entry in enumerate(old_entries)}
+        entries = []
+        vectors = []
+        skipped = {}
+        pending = []
+        added, modified = [], []
+        changed = False
+
+        for filename in sorted(os.listdir(database_folder)):
+            if not filename.endswith(".pdf"):
+                continue
+            filepath = os.path.join(database_folder, filename)
+            stat = os.stat(filepath)
+
+            position = positions_by_name.get(filename)
+            if position is not None and _unchanged(old_entries[position], stat):
+                entries.append(old_entries[position])
+                vectors.append(self.document_vectors(position))
+                continue
+            if filename in self.skipped and _unchanged(self.skipped[filename], stat):
+                skipped[filename] = self.skipped[filename]
+                continue
+
+            changed = True
+            entry = {
+                "filename": filename,
+                "sha256": file_sha256(filepath),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+            }
+            if entry["sha256"] in positions_by_hash:
+                # Renamed or merely touched: the vectors are still valid
+                old_entry = old_entries[positions_by_hash[entry["sha256"]]]
+                entry["chars"] = old_entry.get("chars")
+                entry["chunks"] = old_entry["chunks"]
+                entries.append(entry)
+                vectors.append(self.document_vectors(positions_by_hash[entry["sha256"]]))
+            else:
+                pending.append((entry, filepath))
+                (modified if position is not None else added).append(filename)
+
+        if pending:
+            # New files are parsed across all cores, then all their chunks are embedded together
+            texts = read_pdfs([filepath for _, filepath in pending])
+            chunked = []
+            for entry, filepath in pending:
+                db_text = texts[filepath]
+                chunks = chunk_text(db_text) if not db_text.startswith("Error reading PDF file") else []
+                if chunks:
+                    entry["chars"] = len(db_text)
+                    chunked.append((entry, chunks))
+                else:
+                    # Remembered so an unreadable file is not parsed again until it changes
+                    skipped[entry["filename"]] = entry
+            embeddings = embed_texts([chunk for _, chunks in chunked for chunk in chunks])
+            start = 0
+            for entry, chunks in chunked:
+                doc_embeddings = embeddings[start:start + len(chunks)]
+                start += len(chunks)
+                # A partly embedded document would skew its score; retry it on the next sync
+                if len(doc_embeddings) < len(chunks) or any(not self._valid(e) for e in doc_embeddings):
+                    continue
+                entry["chunks"] = len(chunks)
+                entries.append(entry)
+                vectors.append(normalize_rows(doc_embeddings))
+
+        names = {entry["filename"] for entry in entries}
+        # Files whose embedding failed are left out and retried on the next sync
+        added = [name for name in added if name in names]
+        modified = [name for name in modified if name in names]
+        removed = [name for name in positions_by_name if name not in names and name not in skipped]
+        removed_skipped = [name for name in self.skipped if name not in skipped]
+        changed = changed or bool(removed) or bool(removed_skipped)
+        result = SyncResult(added, modified, removed, changed)
+        if not changed:
+            return result
+
+        order = sorted(range(len(entries)), key=lambda i: entries[i]["filename"])
+        embeddings = np.vstack([vectors[i] for i in order]) if vectors else np.empty((0, 0), dtype=np.float32)
+        self.skipped = skipped
+        self._set([entries[i] for i in order], embeddings)
+        self.save()
+        return result
+
+    def _valid(self, vector):
+        return vector is not None and (self.dimension is None or len(vector) == self.dimension)
+
+    def _get_searcher(self, data, ann_threshold):
+        """Builds the search backend for the current vectors once, on first use after each sync."""
+        with self._searcher_lock:
+            if self._searcher is None or self._searcher[0] is not data or self._searcher[1] != ann_threshold:
+                self._searcher = (data, ann_threshold,
+                                  build_searcher(data[1], ann_threshold, codes=data[4], scale=data[5]))
+            return self._searcher[2]
+
+    def prepare_search(self, ann_threshold=ANN_THRESHOLD):
+        """Builds the search backend ahead of time so the next query does not pay for it."""
+        self._get_searcher(self._data, ann_threshold)
+
+    def search(self, query_embeddings, k=3, aggregate="max", top_chunks=3, exact=False,
+               ann_threshold=ANN_THRESHOLD, n_probe=None, candidates=ANN_CANDIDATES, documents=None,
+               rerank=RERANK_DOCUMENTS):
+        """
+        Finds the k stored documents most similar to a query document.
+        Args:
+            query_embeddings: One vector, or one row per chunk of the query document.
+            k: Number of documents to return.
+            aggregate: How chunk-pair similarities become a document score; see aggregate_chunk_scores.
+            top_chunks: Chunks averaged when aggregate is "mean_top_k".
+            exact: Always scan every stored chunk in float32, whatever the index size and storage.
+            ann_threshold: Stored chunk count above which an approximate (IVF) index is used.
+            n_probe: IVF buckets scanned per query chunk; more is slower but more accurate.
+            candidates: Chunks fetched per query chunk from the IVF index. Every chunk of the
+                documents they belong to is then re-scored exactly.
+            documents: Optional filenames to restrict the comparison to, e.g. lexical candidates.
+            rerank: Documents re-scored in float32 after a scan of a quantized copy.
+        Returns:
+            (indices, scores, filenames), best match first.
+        """
+        data = self._data
+        entries, embeddings, offsets, doc_ids, codes, scale = data
+        if not entries:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), []
+        queries = normalize_rows(np.atleast_2d(query_embeddings))
+        if queries.shape[1] != embeddings.shape[1]:
+            raise ValueError(f"Query vectors have {queries.shape[1]} dimensions but the index holds "
+                             f"{embeddings.shape[1]}; were they made by another embedding backend?")
+        if documents is not None:
+            wanted = set(documents)
+            positions = [i for i, entry in enumerate(entries) if entry["filename"] in wanted]
+            rows = np.flatnonzero(np.isin(doc_ids, positions))
+            indices, scores = _score_rows(data, rows, queries, k, aggregate, top_chunks)
+            return indices, scores, [entries[i]["filename"] for i in indices]
+        searcher = ExactSearcher(embeddings) if exact else self._get_searcher(data, ann_threshold)
+
+        if isinstance(searcher, ExactSearcher) and codes is not None and not exact:
+            # Approximate scores from the quantized copy pick the documents worth re-scoring exactly
+            doc_scores = aggregate_chunk_scores(max_scores(codes, scale, queries), offsets, aggregate, top_chunks)
+            shortlist, _ = select_top_k(doc_scores, max(k, rerank))
+            rows = np.flatnonzero(np.isin(doc_ids, shortlist))
+            indices, scores = _score_rows(data, rows, queries, k, aggregate, top_chunks)
+        elif isinstance(searcher, ExactSearcher):
+            # Chunk-by-chunk similarity matrix, reduced to each stored chunk's best query match
+            chunk_scores = (embeddings @ queries.T).max(axis=1)
+            doc_scores = aggregate_chunk_scores(chunk_scores, offsets, aggregate, top_chunks)
+            indices, scores = select_top_k(doc_scores, k)
+        else:
+            rows = np.concatenate([searcher.search(query, candidates, n_probe)[0] for query in queries])
+            rows = np.flatnonzero(np.isin(doc_ids, np.unique(doc_ids[rows])))
+            indices, scores = _score_rows(data, rows, queries, k, aggregate, top_chunks)
+
+        filenames = [entries[i]["filename"] for i in indices]
+        return indices, scores, filenames
+
+def _score_rows(data, rows, queries, k, aggregate, top_chunks):
+    """Scores the documents owning the given chunk rows exactly; rows must cover whole documents."""
+    _, embeddings, _, doc_ids, _, _ = data
+    if not len(rows):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    chunk_scores = (embeddings[rows] @ queries.T).max(axis=1)
+    row_docs = doc_ids[rows]
+    row_offsets = np.flatnonzero(np.r_[True, row_docs[1:] != row_docs[:-1]])
+    doc_scores = aggregate_chunk_scores(chunk_scores, row_offsets, aggregate, top_chunks)
+    positions, scores = select_top_k(doc_scores, k)
+    return row_docs[row_offsets][positions], scores
+
+def _advise_random(array):
+    """Turns off read-ahead for a memory-mapped array, where the OS supports it."""
+    mapping = getattr(array, "_mmap", None)
+    if mapping is not None and hasattr(mmap, "MADV_RANDOM"):
+        mapping.madvise(mmap.MADV_RANDOM)
+
+def _stamp(path):
+    """Identifies the current version of a file that is only ever replaced, or None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+@contextmanager
+def _file_lock(path):
+    """Holds an exclusive lock on path, across processes where the platform supports it."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _unchanged(entry, stat):
+    return entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
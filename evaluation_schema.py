@@ -0,0 +1,84 @@
+import json
+from dataclasses import asdict, dataclass
+
+CRITERIA = ["clarity_score", "novelty_score", "feasibility_score"]
+
+_CRITERION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "description": "Integer from 1 to 10"},
+        "justification": {"type": "string"},
+    },
+    "required": ["score", "justification"],
+}
+
+# Passed to the model as response_schema so it can only produce this shape
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "clarity_score": _CRITERION_SCHEMA,
+        "novelty_score": _CRITERION_SCHEMA,
+        "feasibility_score": _CRITERION_SCHEMA,
+        "strengths": {"type": "string"},
+        "weaknesses": {"type": "string"},
+    },
+    "required": CRITERIA + ["strengths", "weaknesses"],
+}
+
+@dataclass
+class CriterionScore:
+    score: int
+    justification: str
+
+    @classmethod
+    def from_dict(cls, name, value):
+        if not isinstance(value, dict):
+            raise ValueError(f"'{name}' must be an object with 'score' and 'justification'")
+        score = value.get("score")
+        # JSON has no integer type of its own, so accept 7.0 but not 7.5 or True
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or score != int(score):
+            raise ValueError(f"'{name}.score' must be an integer, got {score!r}")
+        if not 1 <= score <= 10:
+            raise ValueError(f"'{name}.score' must be between 1 and 10, got {score}")
+        justification = value.get("justification")
+        if not isinstance(justification, str) or not justification.strip():
+            raise ValueError(f"'{name}.justification' must be a non-empty string")
+        return cls(int(score), justification)
+
+@dataclass
+class Evaluation:
+    clarity_score: CriterionScore
+    novelty_score: CriterionScore
+    feasibility_score: CriterionScore
+    strengths: str
+    weaknesses: str
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise ValueError("Evaluation must be a JSON object")
+        fields = {name: CriterionScore.from_dict(name, data.get(name)) for name in CRITERIA}
+        for name in ["strengths", "weaknesses"]:
+            if not isinstance(data.get(name), str):
+                raise ValueError(f"'{name}' must be a string")
+            fields[name] = data[name]
+        return cls(**fields)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+def parse_evaluation(text):
+    """
+    Validates a model reply into an Evaluation.
+    Raises:
+        ValueError: If the text is not JSON or does not match EVALUATION_SCHEMA;
+            the message says exactly what is wrong.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {e}") from e
+    return Evaluation.from_dict(data)
@@ -30,35 +30,185 @@ def get_gemini_response(api_key, text):
         return f'{{"error": "An error occurred during AI evaluation: {e}"}}'
         '''
 
-import google.generativeai as genai
+import json
+import time
+import metrics
+from evaluation_schema import EVALUATION_SCHEMA, parse_evaluation
+from prompt_builder import prepare_proposal
+from rate_limiter import call_with_retry, estimate_tokens
+from response_cache import ResponseCache, make_key
 
-def get_gemini_response(api_key, text):
-    try:
-        genai.configure(api_key=api_key)
-        
-        prompt = f"""
+MODEL_NAME = 'models/gemini-pro-latest'
+# Bump whenever the prompt below changes so cached evaluations are not reused
+PROMPT_VERSION = 3
+# Allowance for the reply when charging a request against the tokens-per-minute quota
+RESPONSE_TOKENS_ESTIMATE = 1000
+# The model is constrained to emit JSON matching EVALUATION_SCHEMA
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": EVALUATION_SCHEMA,
+}
+
+_response_cache = None
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+def get_model(api_key, model_name=MODEL_NAME):
+    """Configures the SDK and returns a reusable model object."""
+    # The SDK takes about half a second to import, so it is loaded on first use
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name, generation_config=GENERATION_CONFIG)
+
+def build_prompt(text):
+    """Wraps proposal text, already cleaned and fitted by prepare_proposal, in the evaluation prompt."""
+    return f"""
         You are an expert reviewer. Analyze the following R&D proposal text.
-        Your final output must be a single, raw JSON object and nothing else. Do not wrap it in markdown.
+        Score its clarity, novelty and feasibility with an integer from 1 to 10 each,
+        justify every score, and summarize the proposal's strengths and weaknesses.
 
         **Proposal Text:**
         "{text}"
+        """
 
-        ---
-        **JSON Schema:**
-        {{
-          "clarity_score": {{ "score": <integer 1-10>, "justification": "<string>" }},
-          "novelty_score": {{ "score": <integer 1-10>, "justification": "<string>" }},
-          "feasibility_score": {{ "score": <integer 1-10>, "justification": "<string>" }},
-          "strengths": "<string>",
-          "weaknesses": "<string>"
-        }}
+def build_repair_prompt(prompt, bad_output, error):
+    return f"""{prompt}
+
+        A previous answer to this request was rejected because: {error}
+
+        **Rejected answer:**
+        {bad_output}
+
+        Return the corrected evaluation.
         """
+
+def error_response(message):
+    # Errors are returned as a JSON object too, for consistency
+    return json.dumps({"error": f"An error occurred during AI evaluation: {message}"})
+
+def _generate(model, prompt, stream=False):
+    return call_with_retry(
+        MODEL_NAME,
+        lambda: model.generate_content(prompt, stream=stream),
+        tokens=estimate_tokens(prompt) + RESPONSE_TOKENS_ESTIMATE
+    )
+
+def _record_usage(fields, response, prompt, response_text):
+    """Token counts from the reply's usage metadata, or estimates when it has none."""
+    usage = getattr(response, "usage_metadata", None)
+    fields["prompt_tokens"] = getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt)
+    fields["response_tokens"] = getattr(usage, "candidates_token_count", 0) or estimate_tokens(response_text)
+
+def _validate(model, prompt, response_text):
+    """
+    Validates a reply into an Evaluation, asking the model for at most one repair.
+    Raises:
+        ValueError: If the repaired reply is still invalid.
+    """
+    try:
+        return parse_evaluation(response_text)
+    except ValueError as e:
+        print(f"Evaluation failed validation, requesting one repair: {e}")
+        metrics.count("llm_repairs", model=MODEL_NAME)
+        repaired = _generate(model, build_repair_prompt(prompt, response_text, e))
+        return parse_evaluation(repaired.text)
+
+def _prepare(text, token_budget, fields):
+    """Cleans and fits the proposal text; returns it and its cache key, which covers only what the model sees."""
+    prepared = prepare_proposal(text, token_budget)
+    fields["source_tokens"] = prepared.source_tokens
+    fields["truncated"] = prepared.truncated
+    return prepared.text, make_key(MODEL_NAME, PROMPT_VERSION, prepared.text)
+
+def evaluate_proposal(api_key, text, use_cache=True, model=None, token_budget=None):
+    """
+    Scores a proposal with the model.
+    Args:
+        api_key: Google API key.
+        text: Extracted proposal text.
+        use_cache: Set to False to ignore any cached evaluation and ask the model again.
+        model: A reusable model object from get_model.
+        token_budget: Most estimated tokens of proposal text in the prompt;
+            defaults to prompt_builder.DEFAULT_TOKEN_BUDGET.
+    Returns:
+        A validated Evaluation.
+    Raises:
+        Exception: If the API call fails or the reply cannot be validated.
+    """
+    with metrics.span("llm_evaluation", model=MODEL_NAME, cache_hit=False) as fields:
+        text, cache_key = _prepare(text, token_budget, fields)
+        if use_cache:
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                fields["cache_hit"] = True
+                return parse_evaluation(cached)
+
+        if model is None:
+            model = get_model(api_key)
+        prompt = build_prompt(text)
+        response = _generate(model, prompt)
+        _record_usage(fields, response, prompt, response.text)
+        evaluation = _validate(model, prompt, response.text)
+    # A bypassed lookup still refreshes the cache with the fresh opinion
+    get_response_cache().put(cache_key, evaluation.to_json())
+    return evaluation
+
+def get_gemini_response(api_key, text, use_cache=True, model=None, token_budget=None):
+    """
+    Returns the evaluation as a JSON string that matches EVALUATION_SCHEMA,
+    or a JSON object with an "error" key.
+    """
+    try:
+        return evaluate_proposal(api_key, text, use_cache, model, token_budget).to_json()
+    except Exception as e:
+        return error_response(e)
+
+def stream_gemini_response(api_key, text, use_cache=True, model=None, token_budget=None):
+    """
+    Streaming counterpart of get_gemini_response.
+    Yields:
+        Pieces of the raw model output as they are generated. A cached evaluation is
+        yielded in one piece, and a failure is yielded as the same error JSON object.
+    Returns:
+        Through StopIteration.value, the validated full text, identical to what
+        get_gemini_response would have returned.
+    """
+    start = time.perf_counter()
+    fields = {"model": MODEL_NAME, "cache_hit": False}
+    pieces = []
+    try:
+        text, cache_key = _prepare(text, token_budget, fields)
+        if use_cache:
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                metrics.record("llm_evaluation", time.perf_counter() - start, dict(fields, cache_hit=True))
+                yield cached
+                return cached
+
+        if model is None:
+            model = get_model(api_key)
         
-        model = genai.GenerativeModel('models/gemini-pro-latest')
-        response = model.generate_content(prompt)
-        # Clean the response to ensure it's a valid JSON string
-        clean_response = response.text.strip().replace("```json", "").replace("```", "")
-        return clean_response
+        prompt = build_prompt(text)
+        chunk = None
+        for chunk in _generate(model, prompt, stream=True):
+            pieces.append(chunk.text)
+            if len(pieces) == 1:
+                fields["first_chunk_seconds"] = time.perf_counter() - start
+            yield chunk.text
+        # Only the last streamed chunk carries the usage metadata
+        _record_usage(fields, chunk, prompt, "".join(pieces))
+        evaluation = _validate(model, prompt, "".join(pieces))
     except Exception as e:
-        # Return error as a JSON object for consistency
-        return f'{{"error": "An error occurred during AI evaluation: {e}"}}'
\ No newline at end of file
+        fields["error"] = type(e).__name__
+        metrics.record("llm_evaluation", time.perf_counter() - start, fields)
+        error_text = error_response(e)
+        yield error_text
+        return error_text
+    metrics.record("llm_evaluation", time.perf_counter() - start, fields)
+
+    get_response_cache().put(cache_key, evaluation.to_json())
+    return evaluation.to_json()
@@ -0,0 +1,216 @@
+# Job queue persisted in SQLite, so submitted analyses and their results outlive
+# the browser session, reruns and restarts
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from text_cache import sha256_bytes
+
+JOBS_PATH = os.path.join(".cache", "jobs.sqlite3")
+# Jobs run at the same time per process; set ANALYSIS_WORKERS to change it
+DEFAULT_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", 4))
+# Idle workers look for jobs submitted by other processes this often
+POLL_INTERVAL = 0.5
+# A running job whose worker has not reported for this long is assumed lost with its process
+LEASE_SECONDS = 600
+# A running job's worker renews its lease this often, even while the handler reports nothing
+HEARTBEAT_SECONDS = 30
+# Lost jobs are re-queued until they have been started this many times
+MAX_ATTEMPTS = 2
+# Finished jobs are purged after this long
+RETENTION_SECONDS = 7 * 24 * 3600
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+# params, partial and result are decoded from JSON; partial holds whatever the handler reported so far
+Job = namedtuple("Job", ["id", "status", "filename", "sha256", "params", "progress", "message", "partial",
+                         "result", "error", "attempts", "created", "started", "finished"])
+
+_COLUMNS = ", ".join(Job._fields)
+
+def _decode(value):
+    return None if value is None else json.loads(value)
+
+def _job(row):
+    job = Job(*row)
+    return job._replace(params=_decode(job.params), partial=_decode(job.partial), result=_decode(job.result))
+
+class JobQueue:
+    """
+    Args:
+        handler: Callable(job, payload, report) run on a worker thread for each job. It returns
+            a JSON-serialisable result, or raises to fail the job with the exception's message.
+            report(progress, message=None, partial=None) records progress in [0, 1] for pollers.
+        db_path: SQLite file shared by everyone using this queue.
+        workers: Jobs run at the same time by this process.
+    """
+
+    def __init__(self, handler, db_path=JOBS_PATH, workers=DEFAULT_WORKERS):
+        self.handler = handler
+        self.db_path = db_path
+        self.workers = workers
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT NOT NULL, sha256 TEXT NOT NULL, "
+                "params TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT, partial TEXT, "
+                "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, "
+                "started REAL, finished REAL, heartbeat REAL, payload BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created)")
+        with self._connect() as conn:
+            # Pollers read while workers write, without blocking each other
+            conn.execute("PRAGMA journal_mode=WAL")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the queue safe to use from any thread
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """A write transaction that takes the database lock up front, so two workers never claim one job."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Stops taking new jobs and waits for the running ones to finish."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, payload, filename="", params=None):
+        """
+        Queues a job.
+        Args:
+            payload: Bytes handed to the handler, e.g. an uploaded PDF. Dropped once the job finishes.
+            filename: Name shown to whoever polls the job.
+            params: JSON-serialisable options for the handler.
+        Returns:
+            The new job's ID.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, filename, sha256, params, created, payload) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, filename, sha256_bytes(payload), json.dumps(params or {}), now, payload),
+            )
+            conn.execute("DELETE FROM jobs WHERE finished < ?", (now - RETENTION_SECONDS,))
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        """Returns the Job, or None for an unknown or purged ID."""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def position(self, job_id):
+        """Number of queued jobs that will start before job_id."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created < (SELECT created FROM jobs WHERE id = ?)",
+                (QUEUED, job_id),
+            ).fetchone()
+        return row[0]
+
+    def counts(self):
+        """Returns {status: number of jobs} over every job not yet purged."""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def _claim(self):
+        """Marks the oldest queued job as running and returns (job, payload), or None if there is none."""
+        now = time.time()
+        with self._transaction() as conn:
+            # Jobs of a worker that stopped reporting are retried, up to MAX_ATTEMPTS starts
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, payload = NULL "
+                "WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+                (FAILED, "The worker running this job stopped", now, RUNNING, now - LEASE_SECONDS, MAX_ATTEMPTS),
+            )
+            conn.execute("UPDATE jobs SET status = ? WHERE status = ? AND heartbeat < ?",
+                         (QUEUED, RUNNING, now - LEASE_SECONDS))
+            row = conn.execute("SELECT id, payload FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                               (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, started = ?, heartbeat = ?, attempts = attempts + 1, "
+                "progress = 0, message = NULL, partial = NULL WHERE id = ?",
+                (RUNNING, now, now, row[0]),
+            )
+            job = _job(conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (row[0],)).fetchone())
+        return job, row[1]
+
+    def _update(self, job, **fields):
+        # Matching on attempts ignores a worker whose job was re-queued and started elsewhere
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._transaction() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ? AND attempts = ?",
+                         (*fields.values(), job.id, job.attempts))
+
+    def _run(self, job, payload):
+        def report(progress, message=None, partial=None):
+            self._update(job, progress=progress, message=message, heartbeat=time.time(),
+                         partial=None if partial is None else json.dumps(partial))
+
+        def heartbeat():
+            # Long silent steps, such as building the index on first use, must not look like a lost worker
+            while not done.wait(HEARTBEAT_SECONDS):
+                try:
+                    self._update(job, heartbeat=time.time())
+                except sqlite3.Error as e:
+                    print(f"Job heartbeat failed: {e}")
+
+        done = threading.Event()
+        threading.Thread(target=heartbeat, name=f"job-heartbeat-{job.id}", daemon=True).start()
+        try:
+            result = json.dumps(self.handler(job, payload, report))
+        except Exception as e:
+            self._update(job, status=FAILED, error=str(e) or type(e).__name__, finished=time.time(), payload=None)
+        else:
+            self._update(job, status=DONE, progress=1.0, result=result, finished=time.time(), payload=None)
+        finally:
+            done.set()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim()
+                if claimed is not None:
+                    self._run(*claimed)
+                    continue
+            except sqlite3.Error as e:
+                print(f"Job queue unavailable: {e}")
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
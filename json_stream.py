@@ -0,0 +1,70 @@
+import json
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object that arrives in pieces, reporting each top-level member
+    as soon as its value is complete. Anything before the opening brace, such as
+    a markdown code fence, is ignored.
+    """
+
+    def __init__(self):
+        self.members = {}
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        # Pieces of the member being read, joined only once it is complete; None before the opening brace
+        self._member = None
+
+    def feed(self, chunk):
+        """
+        Adds the next piece of text. Only the new piece is scanned, so the whole reply
+        is parsed in linear time however finely it is split.
+        Returns:
+            A list of (key, value) pairs completed by this piece, in order.
+        """
+        completed = []
+        start = 0
+        for pos, char in enumerate(chunk):
+            if self.done:
+                break
+            if self._member is None:
+                if char == "{":
+                    self._depth = 1
+                    self._member = []
+                    start = pos + 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._finish_member(chunk[start:pos]))
+                    self.done = True
+            elif char == "," and self._depth == 1:
+                completed.extend(self._finish_member(chunk[start:pos]))
+                start = pos + 1
+        if self._member is not None and not self.done:
+            self._member.append(chunk[start:])
+        return completed
+
+    def _finish_member(self, tail):
+        segment = "".join(self._member + [tail]).strip()
+        self._member = []
+        if not segment:
+            return []
+        try:
+            member = json.loads("{" + segment + "}")
+        except json.JSONDecodeError:
+            # Leave malformed members to the final full-text parse to report
+            return []
+        self.members.update(member)
+        return list(member.items())
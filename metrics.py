@@ -0,0 +1,198 @@
+# Timed spans around the expensive operations, exported as JSON log lines,
+# Prometheus text-format metrics and a per-run breakdown
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE = os.environ.get("METRICS_FILE", os.path.join(".cache", "metrics.prom"))
+PREFIX = "rd_evaluator"
+# Latency histogram bucket bounds in seconds
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# String fields exported as Prometheus labels; all others are only logged, to keep cardinality low
+LABEL_FIELDS = ("model",)
+
+logger = logging.getLogger("rd_evaluator.metrics")
+
+class Registry:
+    """Process-wide counters and latency histograms, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name, value, labels):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, labels):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(value, buckets=list(value["buckets"])))
+                                for key, value in self._histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            metric = f"{PREFIX}_{name}_seconds"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            for bound, count in zip(BUCKETS, histogram["buckets"]):
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', str(bound)),))} {count}")
+            lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{metric}_sum{_labels(labels)} {histogram['sum']}")
+            lines.append(f"{metric}_count{_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+registry = Registry()
+
+class Run:
+    """Collects the spans recorded while it is active, for a per-analysis breakdown."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def add(self, operation, seconds, fields):
+        with self._lock:
+            totals = self._operations.setdefault(operation, {"count": 0, "seconds": 0.0})
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            for key, value in fields.items():
+                if key == "cache_hit":
+                    totals["cache_hits"] = totals.get("cache_hits", 0) + bool(value)
+                elif key == "error":
+                    totals["errors"] = totals.get("errors", 0) + 1
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+
+    def breakdown(self):
+        """Returns {operation: {"count", "seconds", and summed numeric fields}}."""
+        with self._lock:
+            return {operation: dict(totals) for operation, totals in self._operations.items()}
+
+_current_run = contextvars.ContextVar("metrics_run", default=None)
+
+@contextmanager
+def collect():
+    """Starts a Run that receives every span recorded in this context until the block ends."""
+    run = Run()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+def propagate(fn):
+    """
+    Wraps fn so that, when called on a worker thread, its spans still reach the Run
+    that was active where propagate was called.
+    """
+    run = _current_run.get()
+
+    def wrapper(*args, **kwargs):
+        token = _current_run.set(run)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_run.reset(token)
+    return wrapper
+
+def _label_values(fields):
+    return tuple((key, str(fields[key])) for key in LABEL_FIELDS if key in fields)
+
+def _log(event):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(event, default=str))
+
+def record(operation, seconds, fields):
+    """Exports one finished operation to the registry, the log and the active Run."""
+    labels = _label_values(fields)
+    registry.increment(f"{operation}_operations", 1, labels)
+    registry.observe(operation, seconds, labels)
+    for key, value in fields.items():
+        if key == "cache_hit":
+            registry.increment(f"{operation}_cache_hits", int(bool(value)), labels)
+        elif key == "error":
+            registry.increment(f"{operation}_errors", 1, labels)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            registry.increment(f"{operation}_{key}", value, labels)
+    _log({"event": operation, "seconds": round(seconds, 6), **fields})
+    run = _current_run.get()
+    if run is not None:
+        run.add(operation, seconds, fields)
+
+def count(event, **fields):
+    """Records an event without a duration, such as a retry."""
+    registry.increment(event, 1, _label_values(fields))
+    _log({"event": event, **fields})
+    run = _current_run.get()
+    if run is not None:
+        run.add(event, 0.0, {})
+
+@contextmanager
+def span(operation, **fields):
+    """
+    Times the enclosed block and records it under operation. The yielded dict holds
+    fields and can be filled in from inside the block (pages, tokens, cache_hit, ...).
+    An exception escaping the block is recorded as the "error" field and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield fields
+    except Exception as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        record(operation, time.perf_counter() - start, fields)
+
+def write_prometheus(path=METRICS_FILE):
+    """Writes the registry as a Prometheus text file, e.g. for node_exporter's textfile collector."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+def configure_logging(path=None):
+    """
+    Sends the JSON metric events to path (one per line), or to stderr when path is None.
+    Safe to call more than once.
+    """
+    if logger.handlers:
+        return
+    handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
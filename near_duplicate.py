@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import threading
+import uuid
+import zlib
+from collections import defaultdict
+import numpy as np
+from embedding_index import SyncResult, _file_lock, _stamp, default_index_dir
+from pdf_reader import read_pdfs
+from text_cache import file_sha256
+
+SIGNATURES_VERSION = 2
+# Held while a process syncs, so processes sharing the index never write it at the same time
+SYNC_LOCK_FILE = "minhash.lock"
+
+# Word 5-grams survive reformatting and light edits but rarely repeat between unrelated texts
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above ~0.7 Jaccard almost always share a bucket, pairs below ~0.4 rarely do
+BANDS = 16
+# Shingles hashed at a time; 4096 x 128 permutations keeps the scratch block at 4 MB however long the document
+SIGNATURE_BLOCK = 4096
+# Estimated Jaccard similarity at which an upload is flagged as a near-duplicate
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+
+def shingles(text, size=SHINGLE_WORDS):
+    """
+    Returns the distinct 32-bit hashes of every run of size consecutive words,
+    after lower-casing and dropping punctuation.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+class MinHasher:
+    """
+    MinHash over num_perm universal hash functions (a * x + b) mod p.
+    The fraction of equal signature positions estimates the Jaccard similarity of two shingle sets.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        # a and b stay below 2**32 so a * x + b cannot overflow 64 bits for 32-bit shingle hashes
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        """Returns the uint32 signature of a shingle hash array; an empty set gives all-max values."""
+        if len(hashes) == 0:
+            return np.full(len(self.a), np.iinfo(np.uint32).max, dtype=np.uint32)
+        best = np.full(len(self.a), np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(hashes), SIGNATURE_BLOCK):
+            values = np.outer(self.a, hashes[start:start + SIGNATURE_BLOCK])
+            values += self.b[:, None]
+            values %= _MERSENNE_PRIME
+            np.minimum(best, values.min(axis=1), out=best)
+        return (best & 0xFFFFFFFF).astype(np.uint32)
+
+def jaccard_estimate(signature, signatures):
+    """Estimated Jaccard similarity between one signature and each row of signatures."""
+    return (signatures == signature).mean(axis=1)
+
+class NearDuplicateIndex:
+    """
+    Offline near-duplicate detector over the extracted text of the database folder.
+    Each PDF is reduced to a MinHash signature of its word shingles and banded into an
+    LSH table, so a query only compares against documents sharing at least one band.
+    It needs no network access, so it still works when the embedding API does not.
+    Args:
+        index_dir: Folder holding minhash.json and the signature file it points to.
+        num_perm: Signature length.
+        bands: LSH bands; num_perm must be divisible by it.
+    """
+
+    def __init__(self, index_dir, num_perm=NUM_PERM, bands=BANDS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.index_dir = index_dir
+        self.num_perm = num_perm
+        self.bands = bands
+        self.hasher = MinHasher(num_perm)
+        self.skipped = {}
+        self._signatures_file = None
+        self._meta_stamp = None
+        self._sync_lock = threading.Lock()
+        self._set([], np.empty((0, num_perm), dtype=np.uint32))
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.index_dir, "minhash.json")
+
+    def _path(self, filename):
+        return os.path.join(self.index_dir, filename)
+
+    @property
+    def entries(self):
+        return self._data[0]
+
+    @property
+    def signatures(self):
+        return self._data[1]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _settings(self):
+        return {
+            "version": SIGNATURES_VERSION,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "shingle_words": SHINGLE_WORDS,
+        }
+
+    def _band_keys(self, signature):
+        return [band.tobytes() for band in signature.reshape(self.bands, -1)]
+
+    def _set(self, entries, signatures):
+        buckets = [defaultdict(list) for _ in range(self.bands)]
+        for position, signature in enumerate(signatures):
+            for band, key in enumerate(self._band_keys(signature)):
+                buckets[band][key].append(position)
+        # Swapped in one assignment so a concurrent query never sees a half-updated table
+        self._data = (entries, signatures, buckets)
+
+    def load(self):
+        if not os.path.exists(self.meta_path):
+            return self
+        try:
+            self._meta_stamp = _stamp(self.meta_path)
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if any(meta.get(key) != value for key, value in self._settings().items()):
+                return self
+            signatures = np.load(self._path(meta["signatures"]))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable near-duplicate index: {e}")
+            return self
+        if len(meta["entries"]) != len(signatures):
+            print("Ignoring near-duplicate index: metadata and signatures are out of step")
+            return self
+        self.skipped = meta.get("skipped", {})
+        self._signatures_file = meta["signatures"]
+        self._set(meta["entries"], signatures)
+        return self
+
+    def save(self):
+        """
+        Writes the signatures to a new file and then points minhash.json at it, so a reader
+        never pairs new signatures with old metadata. Only called with the sync lock held.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        previous_file = self._signatures_file
+        signatures_file = f"minhash-{uuid.uuid4().hex[:12]}.npy"
+        meta = dict(self._settings(), signatures=signatures_file, entries=self.entries, skipped=self.skipped)
+        np.save(self._path(signatures_file), self.signatures)
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp_meta, self.meta_path)
+        self._meta_stamp = _stamp(self.meta_path)
+        self._signatures_file = signatures_file
+        # The previous generation is kept so a process that read the old minhash.json can still open it
+        self._remove_stale({signatures_file, previous_file})
+
+    def _remove_stale(self, keep):
+        for name in os.listdir(self.index_dir):
+            if name.startswith("minhash") and name.endswith(".npy") and name not in keep:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+    def signature(self, text):
+        return self.hasher.signature(shingles(text))
+
+    def sync(self, database_folder):
+        """
+        Brings the signatures in line with the PDFs in database_folder. Unchanged files
+        (same size and mtime) are not read; new text comes through the PDF text cache.
+        Returns:
+            A SyncResult listing what changed.
+        """
+        with self._sync_lock, _file_lock(self._path(SYNC_LOCK_FILE)):
+            # Another process may have saved since; start from its signatures rather than redo its work
+            if _stamp(self.meta_path) != self._meta_stamp:
+                self.load()
+            return self._sync(database_folder)
+
+    def _sync(self, database_folder):
+        old_entries, old_signatures, _ = self._data
+        positions_by_name = {entry["filename"]: i for i, entry in enumerate(old_entries)}
+        positions_by_hash = {entry["sha256"]: i for i, entry in enumerate(old_entries)}
+        entries, signatures, skipped, pending = [], [], {}, []
+        changed = False
+
+        for filename in sorted(os.listdir(database_folder)):
+            if not filename.endswith(".pdf"):
+                continue
+            filepath = os.path.join(database_folder, filename)
+            stat = os.stat(filepath)
+            position = positions_by_name.get(filename)
+            if position is not None and _unchanged(old_entries[position], stat):
+                entries.append(old_entries[position])
+                signatures.append(old_signatures[position])
+                continue
+            if filename in self.skipped and _unchanged(self.skipped[filename], stat):
+                skipped[filename] = self.skipped[filename]
+                continue
+
+            changed = True
+            entry = {"filename": filename, "sha256": file_sha256(filepath),
+                     "size": stat.st_size, "mtime": stat.st_mtime}
+            if entry["sha256"] in positions_by_hash:
+                entries.append(entry)
+                signatures.append(old_signatures[positions_by_hash[entry["sha256"]]])
+            else:
+                pending.append((entry, filepath))
+
+        if pending:
+            texts = read_pdfs([filepath for _, filepath in pending])
+            for entry, filepath in pending:
+                hashes = shingles(texts[filepath]) if not texts[filepath].startswith("Error reading PDF file") else []
+                if len(hashes) == 0:
+                    skipped[entry["filename"]] = entry
+                    continue
+                entries.append(entry)
+                signatures.append(self.hasher.signature(hashes))
+
+        names = {entry["filename"] for entry in entries}
+        added = [entry["filename"] for entry, _ in pending
+                 if entry["filename"] in names and entry["filename"] not in positions_by_name]
+        modified = [entry["filename"] for entry, _ in pending
+                    if entry["filename"] in names and entry["filename"] in positions_by_name]
+        removed = [name for name in positions_by_name if name not in names and name not in skipped]
+        changed = changed or bool(removed) or any(name not in skipped for name in self.skipped)
+        result = SyncResult(added, modified, removed, changed)
+        if not changed:
+            return result
+
+        order = sorted(range(len(entries)), key=lambda i: entries[i]["filename"])
+        matrix = np.array([signatures[i] for i in order], dtype=np.uint32).reshape(-1, self.num_perm)
+        self.skipped = skipped
+        self._set([entries[i] for i in order], matrix)
+        self.save()
+        return result
+
+    def candidates(self, text):
+        """Returns the filenames of stored documents sharing at least one LSH band with text."""
+        data = self._data
+        return [data[0][position]["filename"] for position in self._candidates(data, self.signature(text))]
+
+    def _candidates(self, data, signature):
+        buckets = data[2]
+        positions = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            positions.update(buckets[band].get(key, ()))
+        return sorted(positions)
+
+    def query(self, text, threshold=NEAR_DUPLICATE_THRESHOLD):
+        """
+        Finds stored documents whose estimated Jaccard similarity to text is at least threshold.
+        Only LSH candidates are compared, so a threshold well below ~0.5 will miss matches.
+        Returns:
+            A list of (similarity, filename), most similar first.
+        """
+        data = self._data
+        entries, signatures, _ = data
+        signature = self.signature(text)
+        positions = self._candidates(data, signature)
+        if not positions:
+            return []
+        similarities = jaccard_estimate(signature, signatures[positions])
+        matches = [(float(similarity), entries[position]["filename"])
+                   for position, similarity in zip(positions, similarities) if similarity >= threshold]
+        return sorted(matches, reverse=True)
+
+def _unchanged(entry, stat):
+    return entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+def load_near_duplicates(database_folder, index_dir=None):
+    """Loads the near-duplicate index and brings it in line with the database folder."""
+    index = NearDuplicateIndex(index_dir or default_index_dir(database_folder)).load()
+    index.sync(database_folder)
+    return index
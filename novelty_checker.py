@@ -1,46 +1,103 @@
 import os
+import re
+import threading
 import numpy as np
-import google.generativeai as genai
-from pdf_reader import read_pdf
-
-def get_embedding(text, api_key):
-    try:
-        genai.configure(api_key=api_key)
-        # IMPORTANT: Make sure this model name is correct for your API key
-        result = genai.embed_content(
-            model="models/text-embedding-004", 
-            content=text,
-            task_type="RETRIEVAL_DOCUMENT"
-        )
-        return result['embedding']
-    except Exception as e:
-        print(f"Error creating embedding: {e}")
-        return None
+import metrics
+# get_embedding and get_embeddings are re-exported for existing callers
+from embedding_backends import GeminiBackend, get_embedding, get_embeddings
+from embedding_index import EmbeddingIndex, chunk_text, default_index_dir
 
 def calculate_similarity(vec1, vec2):
     return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
 
-def check_novelty(uploaded_file_text, database_folder, api_key):
-    new_embedding = get_embedding(uploaded_file_text, api_key)
-    if not new_embedding:
+_index_lock = threading.Lock()
+
+def backend_index_dir(database_folder, backend):
+    """Each backend keeps its own index, so switching backends never mixes vectors."""
+    return os.path.join(default_index_dir(database_folder), re.sub(r"[^A-Za-z0-9.]+", "-", backend.name))
+
+def load_index(database_folder, api_key, index_dir=None, backend=None):
+    """
+    Loads the persistent embedding index and embeds any database PDFs it has not seen yet.
+    Args:
+        backend: Embedding backend from embedding_backends; defaults to Gemini.
+    """
+    backend = backend or GeminiBackend(api_key)
+    # Concurrent callers must not embed the same new files twice or interleave saves
+    with _index_lock:
+        index = EmbeddingIndex(index_dir or backend_index_dir(database_folder, backend),
+                               backend.name, backend.dimension).load()
+        index.sync(database_folder, backend.embed)
+    return index
+
+class IndexWatcher:
+    """
+    Keeps an embedding index in step with its database folder from a background thread,
+    for long-running deployments. Searches keep using watcher.index while it syncs.
+    Args:
+        database_folder: Folder of past proposals.
+        api_key: Google API key.
+        interval: Seconds between scans of the folder.
+        index_dir: Optional override of the index location.
+        backend: Embedding backend; defaults to Gemini.
+    """
+
+    def __init__(self, database_folder, api_key, interval=30, index_dir=None, backend=None):
+        self.database_folder = database_folder
+        self.backend = backend or GeminiBackend(api_key)
+        self.interval = interval
+        self.index = load_index(database_folder, api_key, index_dir, self.backend)
+        self.index.prepare_search()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def sync(self):
+        with _index_lock:
+            result = self.index.sync(self.database_folder, self.backend.embed)
+        # Rebuild the ANN index here rather than on the next reviewer's query; this is a no-op
+        # unless the vectors changed, here or in another process sharing the index
+        self.index.prepare_search()
+        if result.changed:
+            print(f"Novelty index updated: {len(result.added)} added, "
+                  f"{len(result.modified)} modified, {len(result.removed)} removed")
+        return result
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Novelty index sync failed: {e}")
+
+def check_novelty(uploaded_file_text, database_folder, api_key, index_dir=None, k=3,
+                  aggregate="max", top_chunks=3, index=None, exact=False, documents=None, backend=None):
+    backend = backend or GeminiBackend(api_key)
+    if index is not None and index.model != backend.name:
+        raise ValueError(f"Index was built with {index.model}, not {backend.name}")
+    # Restricted to an empty candidate set, there is nothing to compare and no need to call the API
+    if documents is not None and not documents:
+        return []
+    # Long proposals are embedded chunk by chunk so no request exceeds the model's input limit
+    chunks = chunk_text(uploaded_file_text)
+    new_embeddings = [e for e in backend.embed(chunks) if e is not None]
+    if not new_embeddings:
         return [] # Return an empty list on error
 
-    similarities = []
-
-    for filename in os.listdir(database_folder):
-        if filename.endswith(".pdf"):
-            filepath = os.path.join(database_folder, filename)
-            
-            with open(filepath, "rb") as f:
-                db_text = read_pdf(f)
-                if db_text and "Error" not in db_text:
-                    db_embedding = get_embedding(db_text, api_key)
-                    if db_embedding:
-                        similarity = calculate_similarity(new_embedding, db_embedding)
-                        similarities.append((similarity, filename))
-    
-    # Sort the list by similarity score in descending order
-    similarities.sort(key=lambda x: x[0], reverse=True)
-    
-    # Return the top 3 matches
-    return similarities[:3]
\ No newline at end of file
+    # Only the uploaded proposal is embedded here; database vectors come from the index
+    if index is None:
+        index = load_index(database_folder, api_key, index_dir, backend)
+
+    # Small archives are scanned exhaustively in one matrix product; large ones go
+    # through an approximate index automatically unless exact is set
+    with metrics.span("similarity_search", query_chunks=len(new_embeddings), documents=len(index)):
+        _, scores, filenames = index.search(np.array(new_embeddings), k, aggregate, top_chunks, exact,
+                                            documents=documents)
+    return [(float(score), filename) for score, filename in zip(scores, filenames)]
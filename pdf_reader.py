@@ -1,19 +1,208 @@
 import PyPDF2
 import io
+import os
+import multiprocessing
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+from importlib.machinery import ModuleSpec
+import metrics
+from text_cache import TextCache, file_sha256, sha256_bytes
 
-def read_pdf(file):
+# Bump whenever read_pdf's output changes so cached text is re-extracted
+EXTRACTOR_VERSION = 3
+# Separates pages in read_pdf's output, as in pdftotext
+PAGE_BREAK = "\f"
+
+_text_cache = None
+
+# Stands in for __main__ while workers start. Its spec name tells multiprocessing there is no main
+# module to re-import, so workers never run the launching script (app.py under Streamlit, or a CLI)
+_WORKER_MAIN = types.ModuleType("__main__")
+_WORKER_MAIN.__spec__ = ModuleSpec("__main__", None)
+_worker_start_lock = threading.Lock()
+
+def iter_pdf_pages(file, max_pages=None, max_chars=None):
+    """
+    Yields the text of a PDF one page at a time, stopping early once a limit is hit.
+    Args:
+        file: A PDF path or binary file object.
+        max_pages: Stop after this many pages.
+        max_chars: Stop once this many characters have been yielded; the last page is cut to fit.
+    Yields:
+        The text of each page. Pages without extractable text yield an empty string.
+    """
+    pdf_reader = PyPDF2.PdfReader(file)
+    remaining = max_chars
+    for page_number, page in enumerate(pdf_reader.pages):
+        if max_pages is not None and page_number >= max_pages:
+            return
+        text = page.extract_text() or ""
+        if remaining is not None:
+            text = text[:remaining]
+            remaining -= len(text)
+        yield text
+        if remaining is not None and remaining <= 0:
+            return
+
+def read_pdf(file, max_pages=None, max_chars=None):
     """
     Reads the text content from an uploaded PDF file.
     Args:
         file: An uploaded file object from Streamlit.
+        max_pages: Optional cap on the number of pages read.
+        max_chars: Optional cap on the number of characters returned.
+    Returns:
+        A string containing all the text from the PDF, with pages separated by PAGE_BREAK.
+    """
+    with metrics.span("pdf_read") as fields:
+        try:
+            pages = list(iter_pdf_pages(file, max_pages, max_chars))
+        except Exception as e:
+            fields["error"] = type(e).__name__
+            return f"Error reading PDF file: {e}"
+        # join is linear in the total length, unlike repeated string concatenation
+        text = PAGE_BREAK.join(pages)
+        fields.update(pages=len(pages), chars=len(text))
+        return text
+
+def get_text_cache():
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = TextCache(EXTRACTOR_VERSION)
+    return _text_cache
+
+def _is_error(text):
+    return text.startswith("Error reading PDF file")
+
+def read_pdf_cached(file):
+    """
+    Like read_pdf, but skips parsing entirely for a PDF whose bytes were seen before.
+    Args:
+        file: PDF bytes or a binary file object.
     Returns:
         A string containing all the text from the PDF.
     """
+    start = time.perf_counter()
+    data = file if isinstance(file, bytes) else file.read()
+    digest = sha256_bytes(data)
+    cache = get_text_cache()
+    text = cache.get(digest)
+    if text is not None:
+        metrics.record("pdf_read", time.perf_counter() - start, {"cache_hit": True, "chars": len(text)})
+    else:
+        text = read_pdf(io.BytesIO(data))
+        if not _is_error(text):
+            cache.put(digest, text)
+    return text
+
+def _read_pdf_path(path):
+    # Runs in a worker process, so it skips metrics: the parent records the batch as a whole
     try:
-        pdf_reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
+        with open(path, "rb") as f:
+            return PAGE_BREAK.join(iter_pdf_pages(f))
+    except Exception as e:
+        return f"Error reading PDF file: {e}"
+
+def _pool_context():
+    # Forking a process that runs other threads (index watcher, job workers, web server) can copy
+    # a lock another thread holds into the child and deadlock it, so workers start from a clean process
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" not in methods:
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    # Workers are forked from a server that has already imported the extractor
+    context.set_forkserver_preload(["pdf_reader"])
+    return context
+
+@contextmanager
+def _clean_main():
+    """Hides the real __main__ while worker processes are started."""
+    with _worker_start_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = _WORKER_MAIN
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+def list_pdfs(folder):
+    """Returns the paths of the PDF files directly inside a folder, sorted by name."""
+    return [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.endswith(".pdf")]
+
+def read_pdfs(paths, max_workers=None, timeout=60, use_cache=True):
+    """
+    Extracts text from many PDFs in parallel worker processes.
+    Args:
+        paths: A folder of PDFs, or a list of PDF paths.
+        max_workers: Number of worker processes. Defaults to one per CPU core.
+        timeout: Seconds to wait for any single document before giving up on it.
+        use_cache: Serve previously extracted documents from the text cache.
+    Returns:
+        A dict mapping each path to its text, or to an "Error reading PDF file" message.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = list_pdfs(paths)
+    # Parsing happens in worker processes, so it is measured here as one batch
+    with metrics.span("pdf_read_batch", documents=len(paths)) as fields:
+        texts, fields["cache_hits"] = _read_pdfs(paths, max_workers, timeout, use_cache)
+        fields["failed"] = sum(1 for text in texts.values() if _is_error(text))
+        fields["chars"] = sum(len(text) for text in texts.values() if not _is_error(text))
+    return texts
+
+def _read_pdfs(paths, max_workers, timeout, use_cache):
+    texts = {}
+    digests = {}
+    if use_cache:
+        cache = get_text_cache()
+        for path in paths:
+            digests[path] = file_sha256(path)
+            text = cache.get(digests[path])
+            if text is not None:
+                texts[path] = text
+    cache_hits = len(texts)
+    paths = [path for path in paths if path not in texts]
+    if not paths:
+        return texts, cache_hits
+    max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+
+    context = _pool_context()
+
+    while paths:
+        # Workers only start here: none of them dies on its own, and a stuck one ends the pool
+        with _clean_main():
+            pool = context.Pool(processes=min(max_workers, len(paths)))
+        try:
+            pending = [(path, pool.apply_async(_read_pdf_path, (path,))) for path in paths]
+            paths = []
+            for i, (path, result) in enumerate(pending):
+                try:
+                    texts[path] = result.get(timeout)
+                except multiprocessing.TimeoutError:
+                    texts[path] = f"Error reading PDF file: timed out after {timeout}s"
+                    # A stuck worker is lost for good; rather than let the documents behind it wait out
+                    # their own timeouts, keep what has finished and rerun the rest on a fresh pool
+                    for later_path, later in pending[i + 1:]:
+                        if later.ready():
+                            texts[later_path] = _result_text(later)
+                        else:
+                            paths.append(later_path)
+                    break
+                except Exception as e:
+                    texts[path] = f"Error reading PDF file: {e}"
+            for path, _ in pending:
+                if use_cache and path in texts and not _is_error(texts[path]):
+                    cache.put(digests[path], texts[path])
+        finally:
+            # terminate() also kills workers still stuck on a malformed document
+            pool.terminate()
+            pool.join()
+    return texts, cache_hits
+
+def _result_text(result):
+    try:
+        return result.get()
     except Exception as e:
-        return f"Error reading PDF file: {e}"
\ No newline at end of file
+        return f"Error reading PDF file: {e}"
@@ -0,0 +1,279 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import metrics
+from embedding_backends import get_backend
+from embedding_index import default_index_dir
+from evaluation_schema import EVALUATION_SCHEMA
+from evaluator import error_response, get_gemini_response, get_model, stream_gemini_response
+from json_stream import IncrementalJSONParser
+from near_duplicate import NearDuplicateIndex
+from novelty_checker import IndexWatcher, check_novelty
+from pdf_reader import read_pdf_cached
+
+# value is None and error holds the exception when a stage fails; note qualifies a value computed
+# differently than asked, e.g. a novelty check that could not be narrowed
+StageResult = namedtuple("StageResult", ["value", "error", "seconds", "note"], defaults=(None,))
+
+STAGE_LABELS = {
+    "duplicates": "🧬 Near-duplicate check",
+    "novelty": "🔬 Novelty check",
+    "evaluation": "🤖 AI evaluation",
+}
+
+def _run_stage(fn):
+    start = time.perf_counter()
+    try:
+        return StageResult(fn(), None, time.perf_counter() - start)
+    except Exception as e:
+        return StageResult(None, e, time.perf_counter() - start)
+
+def _stream_evaluation(api_key, proposal_text, use_cache, model, on_partial, on_piece):
+    parser = IncrementalJSONParser()
+    stream = stream_gemini_response(api_key, proposal_text, use_cache, model)
+    while True:
+        try:
+            piece = next(stream)
+        except StopIteration as stop:
+            return stop.value
+        for key, value in parser.feed(piece):
+            on_partial(key, value)
+        on_piece()
+
+def run_analysis(proposal_text, database_folder, api_key, on_stage_done=None, use_cache=True, index=None,
+                 model=None, on_partial=None, near_duplicates=None, narrow_novelty=False, backend=None,
+                 load_index=None, load_near_duplicates=None):
+    """
+    Runs the near-duplicate check, the novelty check and the LLM evaluation at the same time.
+    No stage needs another's output, so wall-clock time is that of the slowest stage
+    rather than their sum; only with narrow_novelty does the novelty check wait for the
+    duplicates stage. A failure in one stage does not affect the others.
+    Args:
+        proposal_text: Extracted text of the uploaded proposal.
+        database_folder: Folder of past proposals for the novelty check.
+        api_key: Google API key.
+        on_stage_done: Optional callback(stage_name, StageResult), called on the
+            calling thread as each stage finishes, so it may update the UI.
+        use_cache: Set to False to ask the model for a fresh evaluation.
+        index: An already loaded EmbeddingIndex to search instead of loading one.
+        model: A reusable Gemini model object from evaluator.get_model.
+        on_partial: Optional callback(key, value). When given, the evaluation is streamed
+            on the calling thread and each top-level field of the reply is reported as
+            soon as it is complete. The final evaluation text is the same either way.
+        near_duplicates: A synced NearDuplicateIndex. When given, a local "duplicates" stage
+            reports near-exact matches, usually long before the evaluation is done.
+        narrow_novelty: Only compare embeddings against documents that share an LSH bucket
+            with the proposal, skipping the embedding call when there are none. Faster and
+            cheaper, but misses paraphrased overlap with no wording in common.
+        backend: Embedding backend for the novelty check; must match index. Defaults to Gemini.
+        load_index: Optional callable returning (index, backend), used instead of index and backend.
+            It is called inside the novelty stage, so failing to build the index fails only that stage.
+        load_near_duplicates: Optional callable returning a synced NearDuplicateIndex, used instead
+            of near_duplicates and likewise called inside the duplicates stage.
+    Returns:
+        A dict mapping "novelty" and "evaluation" (and "duplicates", when near_duplicates
+        or load_near_duplicates is given) to their StageResult. With narrow_novelty, the
+        novelty result carries a note if the candidates were unavailable.
+    """
+    stages = {}
+    if on_partial is None:
+        stages["evaluation"] = lambda: get_gemini_response(api_key, proposal_text, use_cache, model)
+    candidates = []
+    notes = {}
+    duplicates_done = threading.Event()
+    if near_duplicates is not None or load_near_duplicates is not None:
+        def find_duplicates():
+            try:
+                duplicates_index = near_duplicates if near_duplicates is not None else load_near_duplicates()
+                if narrow_novelty:
+                    candidates.append(duplicates_index.candidates(proposal_text))
+                return duplicates_index.query(proposal_text)
+            finally:
+                duplicates_done.set()
+
+        # A sync of a cold or changed archive reads every new PDF, so it runs beside the evaluation
+        stages["duplicates"] = find_duplicates
+    else:
+        duplicates_done.set()
+
+    def find_similar():
+        novelty_index, novelty_backend = load_index() if load_index is not None else (index, backend)
+        documents = None
+        if narrow_novelty:
+            # Only the novelty check needs the duplicates stage's candidates, so only it waits
+            duplicates_done.wait()
+            if candidates:
+                documents = candidates[0]
+            else:
+                # The novelty check still runs, against everything, but says so
+                notes["novelty"] = "Not narrowed: the near-duplicate check failed, so every document was compared"
+        return check_novelty(proposal_text, database_folder, api_key, index=novelty_index, documents=documents,
+                             backend=novelty_backend)
+
+    stages["novelty"] = find_similar
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+        # Stages on worker threads still report into the caller's metrics run
+        futures = {pool.submit(metrics.propagate(_run_stage), fn): name for name, fn in stages.items()}
+
+        def report_finished(block=False):
+            pending = [future for future, name in futures.items() if name not in results]
+            finished = as_completed(pending) if block else [future for future in pending if future.done()]
+            for future in finished:
+                name = futures[future]
+                results[name] = future.result()._replace(note=notes.get(name))
+                if on_stage_done:
+                    on_stage_done(name, results[name])
+
+        if on_partial is not None:
+            # Partial output updates the UI, so the streamed stage stays on the calling thread,
+            # reporting the other stages between pieces as they finish
+            results["evaluation"] = _run_stage(
+                lambda: _stream_evaluation(api_key, proposal_text, use_cache, model, on_partial, report_finished)
+            )
+            if on_stage_done:
+                on_stage_done("evaluation", results["evaluation"])
+        report_finished(block=True)
+    return results
+
+class AnalysisResources:
+    """
+    The indexes and model object that every analysis in a process shares, each created
+    on first use. Safe to use from any thread.
+    Args:
+        database_folder: Folder of past proposals.
+        api_key: Google API key.
+    """
+
+    def __init__(self, database_folder, api_key):
+        self.database_folder = database_folder
+        self.api_key = api_key
+        self._lock = threading.Lock()
+        # One lock per resource, so a slow first index build holds up only the analyses that need it
+        self._build_locks = {}
+        self._watchers = {}
+        self._near_duplicates = None
+        self._model = None
+
+    def _build_lock(self, name):
+        with self._lock:
+            return self._build_locks.setdefault(name, threading.Lock())
+
+    def novelty(self, backend_name):
+        """
+        Returns (index, backend) for the named embedding backend, keeping the index in step
+        with the folder from a background thread. index is None if it could not be built;
+        check_novelty then loads it itself and reports the failure as a stage error.
+        """
+        with self._build_lock(f"novelty:{backend_name}"):
+            watcher = self._watchers.get(backend_name)
+            if watcher is None:
+                try:
+                    watcher = IndexWatcher(self.database_folder, self.api_key,
+                                           backend=get_backend(backend_name, self.api_key)).start()
+                except Exception as e:
+                    print(f"Novelty index unavailable: {e}")
+                    return None, get_backend(backend_name, self.api_key)
+                self._watchers[backend_name] = watcher
+        return watcher.index, watcher.backend
+
+    def near_duplicates(self):
+        """Returns the MinHash index of the database, synced first; a sync only stats the folder unless a PDF changed."""
+        with self._build_lock("near_duplicates"):
+            if self._near_duplicates is None:
+                self._near_duplicates = NearDuplicateIndex(default_index_dir(self.database_folder)).load()
+        self._near_duplicates.sync(self.database_folder)
+        return self._near_duplicates
+
+    def model(self):
+        with self._build_lock("model"):
+            if self._model is None:
+                self._model = get_model(self.api_key)
+            return self._model
+
+def analyze_pdf(file_bytes, resources, backend="gemini", use_cache=True, stream=False, narrow_novelty=False,
+                on_progress=None):
+    """
+    Reads a proposal PDF and runs every analysis stage on it.
+    Args:
+        file_bytes: The PDF.
+        resources: AnalysisResources of the database to compare against.
+        backend: Name of the embedding backend for the novelty check.
+        use_cache: Set to False to ask the model for a fresh evaluation.
+        stream: Stream the evaluation, reporting each reply field as soon as it is complete.
+        narrow_novelty: Only compare embeddings against lexically similar documents; see run_analysis.
+        on_progress: Optional callback(progress, message, partial) with progress in [0, 1], a status
+            line, and a dict of what is known so far: "near_duplicates" once that check is done,
+            and "evaluation", the evaluation fields streamed so far.
+    Returns:
+        A JSON-serialisable dict with "near_duplicates", "duplicates_error", "top_matches",
+        "novelty_error", "novelty_narrowed" (whether the novelty check only compared lexically
+        similar documents), "novelty_note", "evaluation_result_text" and this analysis' metrics
+        breakdown under "metrics".
+    Raises:
+        ValueError: If the PDF cannot be read.
+    """
+    report = on_progress or (lambda progress, message, partial=None: None)
+    with metrics.collect() as run:
+        report(0.0, "📖 Reading PDF document...")
+        # Re-analyzing the same file is served from the extracted-text cache
+        proposal_text = read_pdf_cached(file_bytes)
+        if proposal_text.startswith("Error reading PDF file"):
+            raise ValueError(proposal_text)
+
+        # Progress counts finished work after the 10% for reading: one unit per stage, except the
+        # evaluation, which is worth one unit per reply field and advances as fields stream in
+        evaluation_fields = len(EVALUATION_SCHEMA["properties"])
+        total_units = len(STAGE_LABELS) - 1 + evaluation_fields
+        progress = {"units": 0, "fields": 0}
+        partial = {"evaluation": {}}
+        status = ["🔬 Checking novelty and 🤖 performing deep AI analysis..."]
+
+        def advance(units):
+            progress["units"] += units
+            report(min(1.0, 0.1 + 0.9 * progress["units"] / total_units), status[0], partial)
+
+        def on_stage_done(stage, result):
+            outcome = "failed" if result.error else f"done in {result.seconds:.1f}s"
+            status[0] = f"{STAGE_LABELS[stage]} {outcome}..."
+            if stage == "duplicates":
+                # Published right away, so a resubmission is flagged long before the evaluation is done
+                partial["near_duplicates"] = result.value or []
+            advance(evaluation_fields - progress["fields"] if stage == "evaluation" else 1)
+
+        def on_partial(key, value):
+            partial["evaluation"][key] = value
+            # The last field's unit is left for on_stage_done, which runs once the reply is validated
+            if progress["fields"] < evaluation_fields - 1:
+                progress["fields"] += 1
+                advance(1)
+            else:
+                advance(0)
+
+        advance(0)
+        results = run_analysis(
+            proposal_text, resources.database_folder, resources.api_key, on_stage_done, use_cache,
+            model=resources.model(), on_partial=on_partial if stream else None, narrow_novelty=narrow_novelty,
+            load_index=lambda: resources.novelty(backend), load_near_duplicates=resources.near_duplicates
+        )
+    duplicates, novelty, evaluation = results["duplicates"], results["novelty"], results["evaluation"]
+    return {
+        "near_duplicates": duplicates.value or [],
+        "duplicates_error": str(duplicates.error) if duplicates.error else None,
+        "top_matches": novelty.value or [],
+        "novelty_error": str(novelty.error) if novelty.error else None,
+        "novelty_narrowed": narrow_novelty and novelty.note is None,
+        "novelty_note": novelty.note,
+        "evaluation_result_text": error_response(evaluation.error) if evaluation.error else evaluation.value,
+        "metrics": run.breakdown(),
+    }
+
+def analysis_handler(resources):
+    """Returns a job_queue handler that runs analyze_pdf on each job's PDF, with the job's params as options."""
+    def handler(job, payload, report):
+        try:
+            return analyze_pdf(payload, resources, on_progress=report, **job.params)
+        finally:
+            metrics.write_prometheus()
+    return handler
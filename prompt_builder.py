@@ -0,0 +1,232 @@
+# Turns extracted proposal text into the compact, token-budgeted text sent to the model
+import os
+import re
+import unicodedata
+from collections import Counter, namedtuple
+from pdf_reader import PAGE_BREAK
+from rate_limiter import estimate_tokens
+
+# Estimated tokens of proposal text per prompt; set PROMPT_TOKEN_BUDGET to change it
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 12_000))
+# Lines this close to the top or bottom of a page are header/footer candidates
+EDGE_LINES = 3
+# A candidate line is boilerplate when it repeats on this share of pages, and on at least BOILERPLATE_MIN_PAGES
+BOILERPLATE_SHARE = 0.5
+BOILERPLATE_MIN_PAGES = 3
+# Appended where a section was cut to fit the budget
+TRUNCATION_MARK = " [...]"
+
+# Canonical section name -> headings that open it. Key sections are kept first when over budget.
+KEY_SECTIONS = {
+    "title": ["project title", "title"],
+    "abstract": ["executive summary", "abstract", "summary"],
+    "objectives": ["aims and objectives", "objectives", "objective", "aims", "goals"],
+    "methodology": ["proposed methodology", "research methodology", "technical approach", "methodology",
+                    "methods", "approach"],
+    "work plan": ["implementation plan", "project plan", "work plan", "workplan", "timeline", "milestones",
+                  "schedule"],
+    "budget": ["budget estimate", "financial requirements", "cost estimate", "budget"],
+}
+# Sections that cost many tokens and say little about clarity, novelty or feasibility
+DROPPED_SECTIONS = {
+    "references": ["references", "bibliography", "works cited"],
+    "annexure": ["annexures", "annexure", "annexes", "annex", "appendices", "appendix"],
+}
+# Other headings, recognised only so they end the section before them
+OTHER_SECTIONS = {
+    "other": ["introduction", "background", "problem statement", "expected outcomes", "outcomes", "deliverables",
+              "risks", "team", "conclusion", "conclusions"],
+}
+
+# Section with name None holds the text before the first heading
+Section = namedtuple("Section", ["name", "heading", "body"])
+PreparedText = namedtuple("PreparedText", ["text", "tokens", "source_tokens", "sections", "truncated"])
+
+_HEADINGS = {alias: name for table in (KEY_SECTIONS, DROPPED_SECTIONS, OTHER_SECTIONS)
+             for name, aliases in table.items() for alias in aliases}
+_ALTERNATIVES = "|".join(sorted((re.escape(alias).replace(r"\ ", r"\s+") for alias in _HEADINGS), key=len,
+                                reverse=True))
+# A capitalised heading alone on its line, optionally numbered ("3. Budget", "Annexure-II") and followed by a colon
+_LINE_HEADING_RE = re.compile(rf"^[ \t]*(?:[\dIVX]+(?:\.\d+)*[.)]?[ \t]+)?({_ALTERNATIVES})"
+                              rf"(?:[ \t]*-?[ \t]*(?:[\dIVX]+|[A-Z])\b)?[ \t]*:?[ \t]*$",
+                              re.IGNORECASE | re.MULTILINE)
+# A capitalised label followed by a colon, even when extraction glued it to the previous word
+_LABEL_HEADING_RE = re.compile(rf"({_ALTERNATIVES})\s*:", re.IGNORECASE)
+_SPACES_RE = re.compile(r"[^\S\n]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+def normalize_whitespace(text):
+    """
+    Replaces ligatures and other compatibility characters (NFKC), collapses runs of spaces
+    and tabs, strips every line and drops empty lines. Page breaks are kept.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    pages = []
+    for page in text.split(PAGE_BREAK):
+        lines = (_SPACES_RE.sub(" ", line).strip() for line in page.split("\n"))
+        pages.append("\n".join(line for line in lines if line))
+    return PAGE_BREAK.join(pages)
+
+def _boilerplate_key(line):
+    # Page numbers differ from page to page, so digits are ignored when comparing lines
+    return _DIGITS_RE.sub("#", line.lower())
+
+def _edges(lines):
+    return set(range(min(EDGE_LINES, len(lines)))) | set(range(max(0, len(lines) - EDGE_LINES), len(lines)))
+
+def strip_boilerplate(pages):
+    """
+    Removes lines that appear near the top or bottom of many pages, such as running
+    headers, footers and page numbers.
+    Args:
+        pages: The normalized text of each page.
+    Returns:
+        The pages without those lines.
+    """
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return list(pages)
+    split_pages = [page.split("\n") for page in pages]
+    counts = Counter()
+    for lines in split_pages:
+        counts.update({_boilerplate_key(lines[i]) for i in _edges(lines)})
+    threshold = max(BOILERPLATE_MIN_PAGES, len(pages) * BOILERPLATE_SHARE)
+    repeated = {key for key, n in counts.items() if n >= threshold}
+    if not repeated:
+        return list(pages)
+    cleaned = []
+    for lines in split_pages:
+        edges = _edges(lines)
+        cleaned.append("\n".join(line for i, line in enumerate(lines)
+                                 if i not in edges or _boilerplate_key(line) not in repeated))
+    return cleaned
+
+def _headings(text):
+    """
+    Yields (start, end, canonical name, heading text) for every heading, in order. start
+    and end span the heading with its numbering and colon.
+    """
+    found = {}
+    for pattern in (_LINE_HEADING_RE, _LABEL_HEADING_RE):
+        for match in pattern.finditer(text):
+            # Lower-case words are usually prose ("the objectives: ...") rather than headings
+            if not match.group(1)[0].isupper():
+                continue
+            # Both patterns can match one heading; keep the widest span
+            start, end, heading = found.get(match.start(1), (match.start(), match.end(), match.group(1)))
+            found[match.start(1)] = (min(start, match.start()), max(end, match.end()), heading)
+    last_end = 0
+    for key in sorted(found):
+        start, end, heading = found[key]
+        if start < last_end:
+            continue
+        last_end = end
+        heading = " ".join(heading.split())
+        yield start, end, _HEADINGS[heading.lower()], heading
+
+def split_sections(text):
+    """
+    Splits normalized text at its section headings.
+    Returns:
+        A list of Section in document order, with section bodies reflowed onto one line.
+    """
+    sections = []
+    name, heading, body_start = None, None, 0
+    for start, end, next_name, next_heading in _headings(text):
+        sections.append(Section(name, heading, " ".join(text[body_start:start].split())))
+        name, heading, body_start = next_name, next_heading, end
+    sections.append(Section(name, heading, " ".join(text[body_start:].split())))
+    return [section for section in sections if section.body or section.heading]
+
+def _render(sections):
+    return "\n\n".join(f"{section.heading}: {section.body}" if section.heading else section.body
+                       for section in sections)
+
+def _truncate(body, tokens):
+    """Cuts body at a word boundary so that it, with TRUNCATION_MARK, fits in about tokens tokens."""
+    max_chars = tokens * 4 - len(TRUNCATION_MARK)
+    if max_chars <= 0:
+        return ""
+    cut = body.rfind(" ", 0, max_chars + 1)
+    return body[:cut if cut > 0 else max_chars] + TRUNCATION_MARK
+
+def _overhead(section):
+    return estimate_tokens(section.heading or "") + 1
+
+def _share_budget(sections, budget):
+    """
+    Splits budget across sections so that short ones are kept whole and the long
+    ones are cut to equal shares of what remains.
+    Returns:
+        The sections, each one fitted to its share.
+    """
+    needs = {i: estimate_tokens(section.body) + _overhead(section) for i, section in enumerate(sections)}
+    shares = {}
+    remaining = budget
+    while needs:
+        share = remaining / len(needs)
+        small = {i: need for i, need in needs.items() if need <= share}
+        if not small:
+            shares.update({i: int(share) for i in needs})
+            break
+        shares.update(small)
+        remaining -= sum(small.values())
+        needs = {i: need for i, need in needs.items() if i not in small}
+    fitted = []
+    for i, section in enumerate(sections):
+        if shares[i] >= estimate_tokens(section.body) + _overhead(section):
+            fitted.append(section)
+        else:
+            fitted.append(section._replace(body=_truncate(section.body, shares[i] - _overhead(section))))
+    return fitted
+
+def fit_to_budget(sections, budget):
+    """
+    Keeps as much of sections as fits in budget estimated tokens. The text before the
+    first heading and the key sections come first; other sections then fill what is left
+    in document order. Document order is kept in the result.
+    Returns:
+        (sections, truncated), where truncated is True if anything was cut or left out.
+    """
+    if estimate_tokens(_render(sections)) <= budget:
+        return sections, False
+    key = [i for i, section in enumerate(sections) if section.name is None or section.name in KEY_SECTIONS]
+    if not key:
+        key = [0]
+    key_sections = [sections[i] for i in key]
+    key_tokens = estimate_tokens(_render(key_sections))
+    if key_tokens >= budget:
+        chosen = dict(zip(key, _share_budget(key_sections, budget)))
+    else:
+        chosen = dict(zip(key, key_sections))
+        remaining = budget - key_tokens
+        for i, section in enumerate(sections):
+            if i in chosen:
+                continue
+            need = estimate_tokens(section.body) + _overhead(section) + 1
+            if need <= remaining:
+                chosen[i] = section
+                remaining -= need
+            elif remaining > _overhead(section) + len(TRUNCATION_MARK):
+                chosen[i] = section._replace(body=_truncate(section.body, remaining - _overhead(section) - 1))
+                remaining = 0
+    return [chosen[i] for i in sorted(chosen) if chosen[i].body], True
+
+def prepare_proposal(text, token_budget=None):
+    """
+    Cleans extracted proposal text and fits it to a token budget for the evaluation prompt.
+    Args:
+        text: Text from pdf_reader.read_pdf, with pages separated by PAGE_BREAK.
+        token_budget: Most estimated tokens of proposal text to keep. Defaults to DEFAULT_TOKEN_BUDGET.
+    Returns:
+        A PreparedText with the text, its estimated tokens, the estimated tokens of the
+        original text, the names of the sections found and whether anything had to be cut.
+    """
+    token_budget = DEFAULT_TOKEN_BUDGET if token_budget is None else token_budget
+    pages = strip_boilerplate(normalize_whitespace(text).split(PAGE_BREAK))
+    sections = split_sections("\n".join(pages))
+    kept = [section for section in sections if section.name not in DROPPED_SECTIONS]
+    fitted, truncated = fit_to_budget(kept, token_budget)
+    prepared = _render(fitted)
+    names = tuple(dict.fromkeys(section.name for section in sections if section.name))
+    return PreparedText(prepared, estimate_tokens(prepared), estimate_tokens(text), names,
+                        truncated or len(kept) < len(sections))
@@ -0,0 +1,50 @@
+# float16/int8 copies of unit-normalized embeddings for cheaper exhaustive scans;
+# the scores are approximate, so callers re-rank the best candidates in float32
+import numpy as np
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+# Rows converted to float32 at a time; 1024 x 768 dims keeps the scratch block near 3 MB
+SCAN_BLOCK = 1024
+
+def quantize(matrix, storage):
+    """
+    Args:
+        matrix: Unit-normalized float32 vectors, one per row; may be memory-mapped.
+        storage: One of STORAGE_TYPES.
+    Returns:
+        (codes, scale): the matrix stored as storage, and for int8 the float32 step of
+        each dimension (codes * scale approximates matrix), otherwise None.
+    """
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage type {storage!r}; expected one of {', '.join(STORAGE_TYPES)}")
+    if storage == "float32":
+        return matrix, None
+    if storage == "float16":
+        return np.asarray(matrix, dtype=np.float16), None
+    # Symmetric per-dimension steps: each column's largest magnitude maps to +/-127
+    scale = np.zeros(matrix.shape[1], dtype=np.float32)
+    for start in range(0, len(matrix), SCAN_BLOCK):
+        scale = np.maximum(scale, np.abs(matrix[start:start + SCAN_BLOCK]).max(axis=0))
+    scale /= 127
+    scale[scale == 0] = 1.0
+    codes = np.empty(matrix.shape, dtype=np.int8)
+    for start in range(0, len(matrix), SCAN_BLOCK):
+        codes[start:start + SCAN_BLOCK] = np.rint(matrix[start:start + SCAN_BLOCK] / scale)
+    return codes, scale
+
+def max_scores(codes, scale, queries):
+    """
+    Approximate best inner product of every stored row with any of the queries.
+    Args:
+        codes, scale: Output of quantize.
+        queries: Unit-normalized float32 query vectors, one per row.
+    Returns:
+        A float32 array with one score per row of codes.
+    """
+    # (codes * scale) @ q == codes @ (scale * q), so the codes never need rescaling
+    queries = queries if scale is None else queries * scale
+    best = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), SCAN_BLOCK):
+        block = np.asarray(codes[start:start + SCAN_BLOCK], dtype=np.float32)
+        best[start:start + len(block)] = (block @ queries.T).max(axis=1)
+    return best
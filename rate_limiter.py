@@ -0,0 +1,145 @@
+import random
+import re
+import threading
+import time
+import metrics
+
+# Requests and tokens per minute for each model. Set these to match your API tier.
+MODEL_LIMITS = {
+    "models/text-embedding-004": (1500, 1_000_000),
+    "models/gemini-pro-latest": (60, 1_000_000),
+}
+DEFAULT_LIMITS = (60, 1_000_000)
+
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+# HTTP status codes worth retrying: throttling and transient server errors
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+                   "InternalServerError", "DeadlineExceeded", "BadGateway", "GatewayTimeout"}
+
+_RETRY_PATTERNS = [
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+]
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for quota accounting
+    return len(text) // 4 + 1
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills continuously up to its capacity.
+    Args:
+        capacity: Largest burst, and the amount refilled per period.
+        period: Seconds taken to refill a full bucket.
+    """
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """
+        Takes amount tokens, going into debt if needed.
+        Returns:
+            Seconds the caller must wait before the tokens are really available.
+        """
+        # A request larger than the bucket can never fit; let it through once the bucket is full
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class ModelLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one model."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, tokens=0):
+        """Blocks until a request of tokens tokens fits the quota; returns the seconds waited."""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(model):
+    """Returns the process-wide limiter shared by every caller of a model."""
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = ModelLimiter(*MODEL_LIMITS.get(model, DEFAULT_LIMITS))
+        return _limiters[model]
+
+def is_retryable(error):
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES
+
+def retry_after_seconds(error):
+    """
+    Extracts a server-suggested wait from an API error, if it carries one.
+    The wait is capped at MAX_DELAY so a large hint cannot stall a worker; negative,
+    infinite or unparseable hints are ignored.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    hints = [headers["Retry-After"]] if "Retry-After" in headers else []
+    message = str(error)
+    for pattern in _RETRY_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            hints.append(match.group(1))
+    for hint in hints:
+        try:
+            seconds = float(hint)
+        except (TypeError, ValueError):
+            continue
+        # NaN fails this comparison too
+        if 0 <= seconds < float("inf"):
+            return min(MAX_DELAY, seconds)
+    return None
+
+def call_with_retry(model, fn, tokens=0, max_retries=MAX_RETRIES):
+    """
+    Calls fn under the model's shared rate limit, retrying throttling and transient
+    errors with jittered exponential backoff, or the server's retry-after hint when given.
+    Args:
+        model: Model name whose quota the call counts against.
+        fn: Zero-argument callable making the API request.
+        tokens: Estimated tokens the request consumes.
+        max_retries: Retries after the first attempt before the error is raised.
+    Returns:
+        Whatever fn returns.
+    """
+    limiter = get_limiter(model)
+    for attempt in range(max_retries + 1):
+        wait = limiter.acquire(tokens)
+        if wait > 0:
+            metrics.record("rate_limit_wait", wait, {"model": model})
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+            print(f"{model} call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            metrics.count("api_retries", model=model, error=type(e).__name__)
+            time.sleep(delay)
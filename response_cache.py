@@ -0,0 +1,107 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+CACHE_PATH = os.path.join(".cache", "responses.sqlite3")
+
+def normalize_text(text):
+    """Collapses whitespace so re-extracted copies of the same proposal share a key."""
+    return " ".join(text.split())
+
+def make_key(model_name, prompt_version, text):
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}|{prompt_version}|{text_hash}"
+
+class ResponseCache:
+    """
+    Two-tier cache of LLM responses: an in-process LRU in front of a SQLite table.
+    Args:
+        db_path: SQLite file for the persistent tier, or None for memory only.
+        ttl_seconds: Entries older than this are treated as missing and purged.
+        max_entries: Size cap of the persistent tier; least recently used rows go first.
+        max_memory_items: Size cap of the in-process tier.
+    """
+
+    def __init__(self, db_path=CACHE_PATH, ttl_seconds=7 * 24 * 3600, max_entries=5000, max_memory_items=256):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                    "created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the cache safe to use from any thread. Using a
+        # connection as a context manager only commits or rolls back, so it is closed here as well.
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key, response, created):
+        with self._lock:
+            self._memory[key] = (response, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                response, created = self._memory[key]
+                if now - created < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    return response
+                del self._memory[key]
+        if not self.db_path:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT response, created FROM responses WHERE key = ? AND created > ?",
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"Response cache read failed: {e}")
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        self._remember(key, response, now)
+        if not self.db_path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now),
+                )
+                conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl_seconds,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error as e:
+            print(f"Response cache write failed: {e}")
@@ -0,0 +1,20 @@
+from embedding_backends import EMBEDDING_MAX_TOKENS_PER_TEXT, make_batches
+
+def test_batches_respect_the_item_limit():
+    assert make_batches(["a"] * 5, batch_size=2) == [[0, 1], [2, 3], [4]]
+
+def test_batches_respect_the_token_limit():
+    # 40 characters estimate to 11 tokens each
+    texts = ["x" * 40] * 4
+    assert make_batches(texts, batch_size=10, max_batch_tokens=25) == [[0, 1], [2, 3]]
+
+def test_oversized_text_gets_a_batch_of_its_own():
+    texts = ["short", "x" * 400, "short"]
+    assert make_batches(texts, batch_size=10, max_batch_tokens=50) == [[0], [1], [2]]
+
+def test_long_texts_count_only_the_tokens_the_model_reads():
+    texts = ["x" * (EMBEDDING_MAX_TOKENS_PER_TEXT * 40)] * 3
+    assert make_batches(texts, batch_size=10, max_batch_tokens=EMBEDDING_MAX_TOKENS_PER_TEXT * 3) == [[0, 1, 2]]
+
+def test_no_texts_gives_no_batches():
+    assert make_batches([]) == []
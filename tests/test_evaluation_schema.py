@@ -0,0 +1,61 @@
+import json
+import pytest
+import evaluator
+from evaluation_schema import parse_evaluation
+
+VALID = {
+    "clarity_score": {"score": 7, "justification": "Clear aims"},
+    "novelty_score": {"score": 6.0, "justification": "Some overlap"},
+    "feasibility_score": {"score": 8, "justification": "Costed plan"},
+    "strengths": "Plan",
+    "weaknesses": "Scope",
+}
+
+def reply(**changes):
+    return json.dumps(dict(VALID, **changes))
+
+def test_valid_reply_is_parsed():
+    evaluation = parse_evaluation(reply())
+    assert evaluation.novelty_score.score == 6
+    assert isinstance(evaluation.novelty_score.score, int)
+    assert json.loads(evaluation.to_json())["strengths"] == "Plan"
+
+@pytest.mark.parametrize("text, message", [
+    ("not json", "not valid JSON"),
+    ("[]", "JSON object"),
+    (reply(clarity_score={"score": 7.5, "justification": "x"}), "clarity_score.score"),
+    (reply(clarity_score={"score": True, "justification": "x"}), "clarity_score.score"),
+    (reply(novelty_score={"score": 11, "justification": "x"}), "between 1 and 10"),
+    (reply(feasibility_score={"score": 5, "justification": " "}), "feasibility_score.justification"),
+    (reply(feasibility_score=5), "feasibility_score"),
+    (reply(strengths=None), "strengths"),
+])
+def test_invalid_reply_names_the_problem(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_evaluation(text)
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def generate_content(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        return FakeResponse(self.replies.pop(0))
+
+def test_invalid_reply_is_repaired_once():
+    model = FakeModel([reply()])
+    evaluation = evaluator._validate(model, "PROMPT", "{broken")
+    assert evaluation.clarity_score.score == 7
+    assert len(model.prompts) == 1
+    assert "PROMPT" in model.prompts[0] and "{broken" in model.prompts[0]
+
+def test_repair_that_is_still_invalid_raises():
+    model = FakeModel([reply(strengths=3)])
+    with pytest.raises(ValueError, match="strengths"):
+        evaluator._validate(model, "PROMPT", "{broken")
+    assert len(model.prompts) == 1
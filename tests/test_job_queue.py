@@ -0,0 +1,103 @@
+import sqlite3
+import threading
+import time
+import pytest
+import job_queue
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.02)
+    raise AssertionError("timed out")
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+def raw(db_path, sql, params=()):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+def test_job_runs_and_its_payload_is_dropped(db_path):
+    def handler(job, payload, report):
+        report(0.5, "half", {"seen": len(payload)})
+        return {"size": len(payload), "params": job.params}
+
+    queue = JobQueue(handler, db_path, workers=1).start()
+    try:
+        job_id = queue.submit(b"pdf", "a.pdf", {"stream": True})
+        wait_for(lambda: queue.get(job_id).status == DONE)
+    finally:
+        queue.stop()
+    job = queue.get(job_id)
+    assert job.result == {"size": 3, "params": {"stream": True}}
+    assert job.partial == {"seen": 3}
+    assert job.progress == 1.0
+    assert raw(db_path, "SELECT payload FROM jobs WHERE id = ?", (job_id,)) == [(None,)]
+
+def test_handler_error_fails_the_job(db_path):
+    def handler(job, payload, report):
+        raise ValueError("bad pdf")
+
+    queue = JobQueue(handler, db_path, workers=1).start()
+    try:
+        job_id = queue.submit(b"pdf")
+        wait_for(lambda: queue.get(job_id).status == FAILED)
+    finally:
+        queue.stop()
+    assert queue.get(job_id).error == "bad pdf"
+
+def test_jobs_start_in_submission_order(db_path):
+    queue = JobQueue(lambda job, payload, report: None, db_path, workers=1)
+    first, second = queue.submit(b"1"), queue.submit(b"2")
+    assert queue.position(second) == 1
+    job, payload = queue._claim()
+    assert (job.id, payload, job.status, job.attempts) == (first, b"1", RUNNING, 1)
+    assert queue.counts() == {QUEUED: 1, RUNNING: 1}
+
+def test_job_with_an_expired_lease_is_requeued_then_failed(db_path):
+    queue = JobQueue(lambda job, payload, report: None, db_path, workers=1)
+    job_id = queue.submit(b"pdf")
+    expired = time.time() - job_queue.LEASE_SECONDS - 1
+
+    job, _ = queue._claim()
+    assert queue._claim() is None
+    raw(db_path, "UPDATE jobs SET heartbeat = ? WHERE id = ?", (expired, job_id))
+    job, payload = queue._claim()
+    assert (job.id, job.attempts, payload) == (job_id, 2, b"pdf")
+
+    raw(db_path, "UPDATE jobs SET heartbeat = ? WHERE id = ?", (expired, job_id))
+    assert queue._claim() is None
+    assert queue.get(job_id).status == FAILED
+
+    # The first worker's late report is ignored once its attempt has been superseded
+    queue._update(job._replace(attempts=1), status=DONE)
+    assert queue.get(job_id).status == FAILED
+
+def test_heartbeat_renews_the_lease_of_a_silent_job(db_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "HEARTBEAT_SECONDS", 0.05)
+    release = threading.Event()
+    queue = JobQueue(lambda job, payload, report: release.wait(5), db_path, workers=1).start()
+    try:
+        job_id = queue.submit(b"pdf")
+        wait_for(lambda: queue.get(job_id).status == RUNNING)
+        first = raw(db_path, "SELECT heartbeat FROM jobs WHERE id = ?", (job_id,))[0][0]
+        wait_for(lambda: raw(db_path, "SELECT heartbeat FROM jobs WHERE id = ?", (job_id,))[0][0] > first)
+    finally:
+        release.set()
+        queue.stop()
+    assert queue.get(job_id).status == DONE
+
+def test_finished_jobs_are_purged_after_the_retention_period(db_path):
+    queue = JobQueue(lambda job, payload, report: None, db_path, workers=1)
+    old, recent = queue.submit(b"1"), queue.submit(b"2")
+    now = time.time()
+    raw(db_path, "UPDATE jobs SET status = ?, finished = ? WHERE id = ?",
+        (DONE, now - job_queue.RETENTION_SECONDS - 1, old))
+    raw(db_path, "UPDATE jobs SET status = ?, finished = ? WHERE id = ?", (DONE, now, recent))
+    queue.submit(b"3")
+    assert queue.get(old) is None
+    assert queue.get(recent).status == DONE
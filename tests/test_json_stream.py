@@ -0,0 +1,42 @@
+import json
+import random
+from json_stream import IncrementalJSONParser
+
+REPLY = {
+    "clarity_score": {"score": 7, "justification": 'Clear, with "quoted" braces } and [brackets'},
+    "novelty_score": {"score": 5, "justification": "Escaped \\\" quote, comma"},
+    "strengths": "Plan, budget",
+    "weaknesses": "",
+}
+
+def feed_all(text, cuts):
+    parser = IncrementalJSONParser()
+    completed = []
+    for start, end in zip([0] + cuts, cuts + [len(text)]):
+        completed += parser.feed(text[start:end])
+    return parser, completed
+
+def test_members_are_reported_in_order_however_the_text_is_split():
+    text = "```json\n" + json.dumps(REPLY) + "\n```"
+    rng = random.Random(0)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(text)), rng.randint(0, 30)))
+        parser, completed = feed_all(text, cuts)
+        assert completed == list(REPLY.items())
+        assert parser.done
+        assert parser.members == REPLY
+
+def test_member_is_reported_once_its_value_is_complete():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"strengths": "Plan"') == []
+    assert parser.feed(', "weak') == [("strengths", "Plan")]
+    assert parser.feed('nesses": "None"}') == [("weaknesses", "None")]
+
+def test_text_after_the_closing_brace_is_ignored():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": 1} {"b": 2}') == [("a", 1)]
+    assert parser.feed(', "c": 3}') == []
+
+def test_malformed_member_is_skipped():
+    parser, completed = feed_all('{"a": tru, "b": 2}', [])
+    assert completed == [("b", 2)]
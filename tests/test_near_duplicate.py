@@ -0,0 +1,97 @@
+import os
+import pytest
+import near_duplicate
+from near_duplicate import NearDuplicateIndex, jaccard_estimate, shingles
+
+def text(seed, words=300):
+    return " ".join(f"w{seed}_{i}" for i in range(words))
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    # Each "PDF" holds its text directly, so syncs need no extraction pool
+    reads = []
+
+    def read_pdfs(paths):
+        reads.extend(os.path.basename(path) for path in paths)
+        return {path: open(path, encoding="utf-8").read() for path in paths}
+
+    monkeypatch.setattr(near_duplicate, "read_pdfs", read_pdfs)
+    folder = tmp_path / "db"
+    folder.mkdir()
+    return folder, reads
+
+def write(folder, name, content, mtime=None):
+    path = folder / name
+    path.write_text(content, encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+def test_sync_tracks_added_modified_and_removed_files(database):
+    folder, reads = database
+    write(folder, "a.pdf", text(1))
+    write(folder, "b.pdf", text(2))
+    index = NearDuplicateIndex(str(folder / ".index")).load()
+    result = index.sync(str(folder))
+    assert (result.added, result.modified, result.removed, result.changed) == (["a.pdf", "b.pdf"], [], [], True)
+
+    reads.clear()
+    assert not index.sync(str(folder)).changed
+    assert reads == []
+
+    write(folder, "a.pdf", text(3), mtime=1_000_000)
+    (folder / "b.pdf").unlink()
+    write(folder, "c.pdf", text(4))
+    result = index.sync(str(folder))
+    assert (result.added, result.modified, result.removed) == (["c.pdf"], ["a.pdf"], ["b.pdf"])
+    assert sorted(reads) == ["a.pdf", "c.pdf"]
+    assert [entry["filename"] for entry in index.entries] == ["a.pdf", "c.pdf"]
+    assert index.query(text(3)) == [(1.0, "a.pdf")]
+    assert index.query(text(1)) == []
+
+def test_saved_index_is_shared_with_other_instances(database):
+    folder, reads = database
+    write(folder, "a.pdf", text(1))
+    first = NearDuplicateIndex(str(folder / ".index")).load()
+    first.sync(str(folder))
+    second = NearDuplicateIndex(str(folder / ".index")).load()
+    assert len(second) == 1
+
+    write(folder, "b.pdf", text(2))
+    first.sync(str(folder))
+    reads.clear()
+    # The second instance picks up the first one's save instead of reading b.pdf again
+    assert not second.sync(str(folder)).changed
+    assert reads == []
+    assert [entry["filename"] for entry in second.entries] == ["a.pdf", "b.pdf"]
+    signature_files = [name for name in os.listdir(folder / ".index") if name.endswith(".npy")]
+    assert len(signature_files) <= 2
+
+def test_files_without_text_are_skipped_until_they_change(database):
+    folder, reads = database
+    write(folder, "empty.pdf", "")
+    index = NearDuplicateIndex(str(folder / ".index")).load()
+    index.sync(str(folder))
+    assert len(index) == 0 and "empty.pdf" in index.skipped
+    reads.clear()
+    assert not index.sync(str(folder)).changed
+    assert reads == []
+
+def test_near_duplicate_is_found_and_unrelated_text_is_not(database):
+    folder, _ = database
+    original = text(1, 400)
+    write(folder, "a.pdf", original)
+    write(folder, "b.pdf", text(2, 400))
+    index = NearDuplicateIndex(str(folder / ".index")).load()
+    index.sync(str(folder))
+    edited = original.replace("w1_200 ", "changed ", 1)
+    matches = index.query(edited)
+    assert [filename for _, filename in matches] == ["a.pdf"]
+    assert matches[0][0] > 0.9
+    assert index.candidates(text(3, 400)) == []
+
+def test_signature_estimates_jaccard_similarity():
+    index = NearDuplicateIndex("unused")
+    a, b = text(1, 1000), text(1, 1000).replace("w1_5", "x", 300)
+    exact = len(set(shingles(a)) & set(shingles(b))) / len(set(shingles(a)) | set(shingles(b)))
+    estimate = jaccard_estimate(index.signature(a), index.signature(b)[None, :])[0]
+    assert abs(estimate - exact) < 0.15
@@ -0,0 +1,51 @@
+from pdf_reader import PAGE_BREAK
+from prompt_builder import TRUNCATION_MARK, prepare_proposal, split_sections, strip_boilerplate
+from rate_limiter import estimate_tokens
+
+def words(count, word="method"):
+    return " ".join(f"{word}{i}" for i in range(count))
+
+def proposal(body_words=200):
+    return "\n".join([
+        "Project Title: Smart Conveyor Monitoring",
+        "Abstract", words(body_words, "summary"),
+        "Introduction", words(body_words, "context"),
+        "Methodology", words(body_words, "method"),
+        "Budget: " + words(body_words, "cost"),
+        "References", words(body_words, "citation"),
+    ])
+
+def test_sections_are_split_at_headings():
+    names = [section.name for section in split_sections(proposal(5))]
+    assert names == ["title", "abstract", "other", "methodology", "budget", "references"]
+
+def test_references_are_dropped_without_a_budget_cut():
+    prepared = prepare_proposal(proposal(20), token_budget=10_000)
+    assert "citation" not in prepared.text
+    assert "method0" in prepared.text
+    assert prepared.truncated
+
+def test_text_is_fitted_to_the_budget():
+    for budget in (50, 200, 400, 1000):
+        prepared = prepare_proposal(proposal(300), token_budget=budget)
+        assert prepared.tokens <= budget
+        assert prepared.truncated
+        assert TRUNCATION_MARK in prepared.text
+    assert prepare_proposal(proposal(300), token_budget=200).source_tokens == estimate_tokens(proposal(300))
+
+def test_key_sections_are_kept_before_other_sections():
+    prepared = prepare_proposal(proposal(300), token_budget=1000)
+    assert "summary0" in prepared.text and "method0" in prepared.text and "cost0" in prepared.text
+    assert "context0" not in prepared.text
+
+def test_short_text_is_kept_whole():
+    prepared = prepare_proposal("Abstract\nA  short\tproposal.", token_budget=1000)
+    assert prepared.text == "Abstract: A short proposal."
+    assert not prepared.truncated
+
+def test_running_headers_and_page_numbers_are_stripped():
+    bodies = ["Sensors", "Gateway", "Dashboard", "Pilot", "Costs"]
+    pages = [f"CONFIDENTIAL DRAFT\n{body}\nPage {i}" for i, body in enumerate(bodies, 1)]
+    assert strip_boilerplate(pages) == bodies
+    prepared = prepare_proposal(PAGE_BREAK.join(pages), token_budget=1000)
+    assert "CONFIDENTIAL" not in prepared.text and "Page" not in prepared.text
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from embedding_index import EmbeddingIndex
+from quantization import max_scores, quantize
+from vector_ops import normalize_rows
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return normalize_rows(rng.standard_normal((3000, 64)).astype(np.float32))
+
+@pytest.fixture
+def queries():
+    rng = np.random.default_rng(1)
+    return normalize_rows(rng.standard_normal((4, 64)).astype(np.float32))
+
+def test_int8_scores_stay_within_the_rounding_bound(vectors, queries):
+    codes, scale = quantize(vectors, "int8")
+    assert codes.dtype == np.int8
+    exact = (vectors @ queries.T).max(axis=1)
+    approx = max_scores(codes, scale, queries)
+    # Each element is off by at most half a step, so a score is off by at most sum(|q| * scale) / 2
+    bound = (np.abs(queries) * scale).sum(axis=1).max() / 2
+    assert np.abs(approx - exact).max() <= bound + 1e-6
+
+def test_float16_scores_are_close(vectors, queries):
+    codes, scale = quantize(vectors, "float16")
+    assert codes.dtype == np.float16 and scale is None
+    exact = (vectors @ queries.T).max(axis=1)
+    assert np.abs(max_scores(codes, scale, queries) - exact).max() < 2e-3
+
+def test_unknown_storage_is_rejected(vectors):
+    with pytest.raises(ValueError, match="Unknown storage"):
+        quantize(vectors, "int4")
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_quantized_search_matches_exact_search(tmp_path, vectors, queries, storage):
+    entries = [{"filename": f"doc{i}.pdf", "chunks": 3} for i in range(len(vectors) // 3)]
+    exact_index = EmbeddingIndex(str(tmp_path), "test", storage="float32")
+    exact_index._set(entries, vectors)
+    index = EmbeddingIndex(str(tmp_path), "test", storage=storage)
+    index._set(entries, vectors, *quantize(vectors, storage))
+    for query in queries:
+        expected = exact_index.search(query, k=10, exact=True)
+        found = index.search(query, k=10)
+        # The shortlist is re-scored in float32, so the reported scores are exact
+        assert found[2] == expected[2]
+        np.testing.assert_allclose(found[1], expected[1], rtol=1e-5)
@@ -0,0 +1,88 @@
+import pytest
+import rate_limiter
+from rate_limiter import MAX_DELAY, TokenBucket, call_with_retry, retry_after_seconds
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+def test_bucket_allows_a_burst_then_asks_callers_to_wait(clock):
+    bucket = TokenBucket(2, period=1.0)
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(0.5)
+    # Debt is carried, so the next caller waits behind the previous one
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+def test_bucket_refills_up_to_its_capacity(clock):
+    bucket = TokenBucket(2, period=1.0)
+    bucket.reserve(2)
+    clock.now += 0.5
+    assert bucket.reserve(1) == 0
+    clock.now += 100
+    assert bucket.reserve(2) == 0
+    assert bucket.reserve(1) == pytest.approx(0.5)
+
+def test_request_larger_than_the_bucket_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(10, period=1.0)
+    bucket.reserve(5)
+    assert bucket.reserve(1000) == pytest.approx(0.5)
+
+class Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+class ApiError(Exception):
+    def __init__(self, message="", headers=None, code=429):
+        super().__init__(message)
+        self.code = code
+        self.response = Response(headers or {})
+
+@pytest.mark.parametrize("headers, message, expected", [
+    ({"Retry-After": "2"}, "", 2.0),
+    ({"Retry-After": "3600"}, "", MAX_DELAY),
+    ({"Retry-After": "-5"}, "", None),
+    ({"Retry-After": "nan"}, "", None),
+    ({"Retry-After": "inf"}, "", None),
+    ({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, "please retry in 3s", 3.0),
+    ({}, "retry_delay { seconds: 7 }", 7.0),
+    ({}, "please retry in 900s", MAX_DELAY),
+    ({}, "quota exceeded", None),
+])
+def test_retry_after_hints_are_capped_and_bad_ones_ignored(headers, message, expected):
+    assert retry_after_seconds(ApiError(message, headers)) == expected
+
+def test_retryable_errors_are_retried_with_the_server_hint(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleeps.append)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ApiError(headers={"Retry-After": "10000"})
+        return "ok"
+
+    assert call_with_retry("test-model", flaky, max_retries=5) == "ok"
+    assert sleeps == [MAX_DELAY, MAX_DELAY]
+
+def test_other_errors_are_raised_at_once(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ApiError(code=400)
+
+    with pytest.raises(ApiError):
+        call_with_retry("test-model", broken)
+    assert len(calls) == 1
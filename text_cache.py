@@ -0,0 +1,86 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+CACHE_DIR = os.path.join(".cache", "pdf_text")
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def file_sha256(filepath):
+    """Returns the hex SHA-256 digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TextCache:
+    """
+    Two-tier cache of extracted PDF text keyed by the SHA-256 of the file bytes:
+    an in-memory LRU in front of one file per document on disk.
+    Args:
+        version: Extractor version. Entries written by any other version are discarded.
+        cache_dir: Root folder of the on-disk tier, or None for memory only.
+        max_items: Number of documents kept in memory.
+    """
+
+    def __init__(self, version, cache_dir=CACHE_DIR, max_items=128):
+        self.version = str(version)
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            self._purge_stale_versions()
+
+    def _version_dir(self):
+        return os.path.join(self.cache_dir, f"v{self.version}")
+
+    def _path(self, digest):
+        return os.path.join(self._version_dir(), digest[:2], f"{digest}.txt")
+
+    def _purge_stale_versions(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("v") and name != f"v{self.version}":
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def _remember(self, digest, text):
+        with self._lock:
+            self._memory[digest] = text
+            self._memory.move_to_end(digest)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, digest):
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return self._memory[digest]
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(digest), "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        self._remember(digest, text)
+        return text
+
+    def put(self, digest, text):
+        self._remember(digest, text)
+        if not self.cache_dir:
+            return
+        path = self._path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write text cache entry: {e}")
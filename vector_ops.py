@@ -0,0 +1,26 @@
+import numpy as np
+
+def normalize_rows(matrix):
+    """Scales each row to unit length so a dot product is a cosine similarity."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def select_top_k(scores, k):
+    """Returns (indices, scores) of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    # argpartition is O(n); only the k survivors are fully sorted
+    indices = np.argpartition(-scores, k - 1)[:k]
+    indices = indices[np.argsort(-scores[indices])]
+    return indices, scores[indices]
+
+def top_k(matrix, query, k):
+    """
+    Scores every row of a unit-normalized matrix against a unit-normalized query.
+    Returns:
+        (indices, scores) of the k best rows, best first.
+    """
+    return select_top_k(matrix @ query, k)